@@ -0,0 +1,69 @@
+import threading
+
+
+class BackgroundWorker:
+    """一个后台线程处理提交的请求, 默认只保留最新的一个
+
+    子类在 __init__ 里调用 start_thread(name) (和 QObject 一起继承时放在 QObject 后面), 实现 handle(request);
+    handle 在工作线程里锁外调用, 异常会被打印出来. post() 覆盖还没开始处理的请求, 返回新的 generation,
+    handle 收到 (generation, 请求), 处理中用 is_stale(generation) 判断有没有更新的请求.
+    要把每个请求都处理掉的子类 (SnippetWriter) 重写 has_request/take_request/finish_request, 这三个都在持有锁时调用.
+    """
+
+    def start_thread(self, name):
+        self.generation = 0
+        self.pending = None  # (generation, 请求)
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def post(self, request):
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, request)
+            self.condition.notify_all()
+            return self.generation
+
+    def is_stale(self, generation):
+        return generation != self.generation
+
+    def has_request(self):
+        return self.pending is not None
+
+    def take_request(self):
+        request = self.pending
+        self.pending = None
+        return request
+
+    def finish_request(self, request):
+        pass
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    def close(self):
+        # 还没开始处理的请求直接丢掉, 等正在处理的那个结束
+        with self.condition:
+            self.closed = True
+            self.pending = None
+            self.condition.notify_all()
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.has_request() and not self.closed:
+                    self.condition.wait()
+                if not self.has_request():
+                    return
+                request = self.take_request()
+
+            try:
+                self.handle(request)
+            except Exception as e:
+                print(f"Error in {self.thread.name}: {e}")
+
+            with self.condition:
+                self.finish_request(request)
+                self.condition.notify_all()
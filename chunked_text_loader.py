@@ -0,0 +1,49 @@
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtGui import QTextCursor
+
+
+class ChunkedTextLoader(QObject):
+    """把大段文本分块插入到 editor, 每个事件循环只插入一块, 界面在加载过程中保持可交互"""
+
+    finished = pyqtSignal()
+
+    def __init__(self, editor, chunk_size=64 * 1024, parent=None):
+        super().__init__(parent)
+        self.editor = editor
+        self.chunk_size = chunk_size
+        self.pending_chunks = []
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.load_next_chunk)
+
+    def isActive(self):
+        return self.timer.isActive()
+
+    def load(self, text):
+        self.cancel()
+        # 加载期间不记录 undo
+        self.editor.document().setUndoRedoEnabled(False)
+        self.editor.setPlainText('')
+
+        size = self.chunk_size
+        self.pending_chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        self.pending_chunks.reverse()
+        self.timer.start()
+
+    def cancel(self):
+        if self.timer.isActive():
+            self.timer.stop()
+            self.editor.document().setUndoRedoEnabled(True)
+        self.pending_chunks = []
+
+    def load_next_chunk(self):
+        if self.pending_chunks:
+            cursor = QTextCursor(self.editor.document())
+            cursor.movePosition(QTextCursor.End)
+            cursor.insertText(self.pending_chunks.pop())
+            return
+
+        self.timer.stop()
+        self.editor.document().setUndoRedoEnabled(True)
+        self.finished.emit()
@@ -0,0 +1,85 @@
+import os
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+from background_worker import BackgroundWorker
+
+
+class DataDirWatcher(QObject, BackgroundWorker):
+    """监视 data 目录, 把一段时间内的文件事件合并成一次增量扫描
+
+    store 自己写盘 (自动保存的临时文件和原子替换, index 日志) 也会触发目录事件: 防抖结束时先比较目录的 mtime,
+    还是 store 自己最后一次修改后的值就不扫描; 文件事件里文件的 size/mtime 和 index 里一样的也忽略.
+    真正的扫描在后台线程里做, 结果通过 snippets_changed 信号回到界面线程.
+    """
+
+    # (新增/修改过的元数据列表, 被删除的 key 列表)
+    snippets_changed = pyqtSignal(list, list)
+
+    def __init__(self, store, debounce_ms=300, max_watched_files=2000, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.max_watched_files = max_watched_files
+        self.ignored_paths = {os.path.normpath(path) for path in (store.index_path, store.index_log_path)}
+        self.files_changed = False
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce_ms)
+        self.debounce_timer.timeout.connect(self.rescan)
+
+        self.start_thread('DataDirWatcher')
+
+        # 目录事件覆盖新增/删除/改名, 文件事件覆盖原地修改
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.addPath(self.store.data_dir)
+        self.watch_files(self.store.keys())
+        self.watcher.directoryChanged.connect(self.schedule_rescan)
+        self.watcher.fileChanged.connect(self.file_changed)
+        self.snippets_changed.connect(self.watch_changed_files)
+
+    def watch_files(self, file_paths):
+        # 文件太多时只监视目录 (inotify/句柄数量有限), 原子替换和增删仍然能被目录事件捕获
+        watched = set(self.watcher.files())
+        room = self.max_watched_files - len(watched)
+        if room <= 0:
+            return
+        new_paths = [path for path in file_paths if path not in watched][:room]
+        if new_paths:
+            self.watcher.addPaths(new_paths)
+
+    def watch_changed_files(self, changed, removed):
+        # 删除的文件 QFileSystemWatcher 会自己移除
+        self.watch_files([meta['file_path'] for meta in changed])
+
+    def file_changed(self, path):
+        normalized = os.path.normpath(path)
+        if normalized.endswith('.tmp') or normalized in self.ignored_paths:
+            return
+        if self.store.is_own_version(path):
+            # 自己保存的版本; 原子替换后文件被移出监视, 重新加上
+            if path not in self.watcher.files() and os.path.exists(path):
+                self.watch_files([path])
+            return
+        self.files_changed = True
+        self.schedule_rescan()
+
+    def schedule_rescan(self, path=None):
+        # 每次事件都重新计时, 一批同步过来的文件只触发一次扫描
+        self.debounce_timer.start()
+
+    def rescan(self):
+        # 只有自己写盘引起的事件时不扫描, 只需要 stat 一次目录
+        if not self.files_changed and not self.store.has_external_changes():
+            return
+        self.files_changed = False
+        self.post(None)
+
+    def close(self):
+        self.debounce_timer.stop()
+        super().close()
+
+    def handle(self, request):
+        changed, removed = self.store.scan_changes()
+        if changed or removed:
+            self.snippets_changed.emit(changed, removed)
@@ -0,0 +1,153 @@
+import re
+import sys
+import time
+import heapq
+
+
+# 打分参考 fzf: 每个匹配字符 16 分, 词首/分隔符之后的字符有额外加分, 连续匹配加分, 中间的空隙扣分
+SCORE_MATCH = 16
+BONUS_BOUNDARY = 8
+BONUS_CONSECUTIVE = 4
+BONUS_FIRST_CHAR_MULTIPLIER = 2
+PENALTY_GAP_START = 3
+PENALTY_GAP_EXTENSION = 1
+# 最近修改的 snippet 最多加这么多分 (不到一个词首加分), 只在匹配质量相近时起作用
+RECENCY_WEIGHT = 6
+# 经常使用的 snippet 最多加这么多分 (frecency 分数 s 加 USAGE_WEIGHT * s / (s + 1)), 用得越多越接近上限
+USAGE_WEIGHT = 12
+
+
+def fuzzy_score(pattern, text):
+    """pattern 是 text 的子序列时返回分数, 否则返回 None; 两个参数都应该已经 casefold"""
+    find = text.find
+    # 正向找到最早能完成匹配的位置
+    end = 0
+    for ch in pattern:
+        end = find(ch, end)
+        if end < 0:
+            return None
+        end += 1
+
+    # 反向收缩窗口的起点, 得到以 end 结尾的最短匹配
+    start = end
+    for ch in reversed(pattern):
+        start = text.rfind(ch, 0, start)
+
+    # 第一个字符
+    position = find(pattern[0], start)
+    bonus = BONUS_BOUNDARY * BONUS_FIRST_CHAR_MULTIPLIER if position == 0 or not text[position - 1].isalnum() else 0
+    score = SCORE_MATCH + bonus
+    previous = position
+    for ch in pattern[1:]:
+        position = find(ch, previous + 1)
+        if position == previous + 1:
+            # 连续匹配
+            score += SCORE_MATCH + (BONUS_BOUNDARY if not text[previous].isalnum() else BONUS_CONSECUTIVE)
+        else:
+            score += (SCORE_MATCH - PENALTY_GAP_START - (position - previous - 2) * PENALTY_GAP_EXTENSION
+                      + (BONUS_BOUNDARY if not text[position - 1].isalnum() else 0))
+        previous = position
+    return score
+
+
+class FuzzySearch:
+    """对 (key, text, timestamp) 做模糊匹配, 返回按分数排序的前 top_k 个 key
+
+    上一次查询匹配到的全部候选 (不只是 top_k) 会保留下来; 新查询是上一次查询后面追加字符时,
+    匹配结果一定是上一次的子集, 只需要对上一次的结果重新打分.
+    """
+
+    def __init__(self, top_k=500):
+        self.top_k = top_k
+        self.items = []  # [(key, folded_text, recency)]
+        self.usage_boosts = {}  # key -> 使用频率加分
+        self.last_query = None
+        self.last_matches = None  # 上一次匹配到的 items 下标
+
+    def set_items(self, items):
+        """items: [(key, text, timestamp), ...]; timestamp 字符串可以按字典序比较新旧"""
+        items = list(items)
+        order = sorted(range(len(items)), key=lambda i: items[i][2])
+        recency = [0.0] * len(items)
+        for rank, i in enumerate(order):
+            recency[i] = RECENCY_WEIGHT * (rank + 1) / len(items)
+        self.items = [(key, text.casefold(), recency[i]) for i, (key, text, _) in enumerate(items)]
+        self.last_query = None
+        self.last_matches = None
+
+    def set_usage(self, scores):
+        """scores: {key: 衰减到现在的 frecency 分数}, 只影响打分, 不影响匹配到哪些"""
+        self.usage_boosts = {key: USAGE_WEIGHT * score / (score + 1.0) for key, score in scores.items() if score > 0}
+
+    def search(self, query, is_cancelled=None):
+        """返回 [(key, score), ...], 分数从高到低; is_cancelled() 返回 True 时中止并返回 None"""
+        pattern = ''.join(query.casefold().split())
+        if not pattern:
+            self.last_query = None
+            self.last_matches = None
+            return []
+
+        if self.last_query is not None and pattern.startswith(self.last_query):
+            candidates = self.last_matches
+        else:
+            candidates = range(len(self.items))
+
+        # 先用正则在 C 里筛掉不是子序列的, 只给剩下的打分
+        subsequence = re.compile('.*?'.join(map(re.escape, pattern)), re.DOTALL).search
+        items = self.items
+        usage_boosts = self.usage_boosts
+        matches = []
+        scored = []
+        for count, i in enumerate(candidates):
+            if is_cancelled is not None and count % 4096 == 0 and is_cancelled():
+                return None
+            key, text, recency = items[i]
+            if subsequence(text) is None:
+                continue
+            matches.append(i)
+            scored.append((fuzzy_score(pattern, text) + recency + usage_boosts.get(key, 0.0), i))
+
+        self.last_query = pattern
+        self.last_matches = matches
+        top = heapq.nlargest(self.top_k, scored)
+        return [(items[i][0], score) for score, i in top]
+
+
+def benchmark(item_count=100000, typed='snippet 4212'):
+    # python fuzzy_search.py [item_count]
+    import random
+    random.seed(0)
+    words = ['docker', 'compose', 'kubectl', 'snippet', 'python', 'deploy', 'config', 'server', 'client', 'query']
+    items = [(f'data/snippet_{i:08d}.json', f'{random.choice(words)} {random.choice(words)} {i}',
+              f'2025-{1 + i % 12:02d}-{1 + i % 28:02d} 00:00:00.000') for i in range(item_count)]
+
+    search = FuzzySearch()
+    start = time.perf_counter()
+    search.set_items(items)
+    print(f'set_items {item_count}: {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    total_incremental = 0.0
+    total_full = 0.0
+    for length in range(1, len(typed) + 1):
+        query = typed[:length]
+        start = time.perf_counter()
+        result = search.search(query)
+        incremental = time.perf_counter() - start
+        candidates = len(search.last_matches)
+
+        full_search = FuzzySearch()
+        full_search.items = search.items
+        start = time.perf_counter()
+        full_search.search(query)
+        full = time.perf_counter() - start
+
+        total_incremental += incremental
+        total_full += full
+        top = result[0][0] if result else '-'
+        print(f'{query!r:16s} incremental {incremental * 1000:7.1f} ms   full {full * 1000:7.1f} ms   '
+              f'{candidates} matches, top {top}')
+    print(f'typing {typed!r}: incremental {total_incremental * 1000:.0f} ms, full rescans {total_full * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,226 @@
+import re
+import sys
+import time
+from collections import OrderedDict
+
+import markdown
+from markdown.extensions.fenced_code import FencedBlockPreprocessor
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from background_worker import BackgroundWorker
+
+
+# 和 fenced_code 扩展用同一个正则找代码块, 切分时和它看到的一样
+FENCED_BLOCK_RE = FencedBlockPreprocessor.FENCED_BLOCK_RE
+LIST_ITEM_RE = re.compile(r'^ {0,3}([*+-]|\d+[.)])\s')
+QUOTE_RE = re.compile(r'^ {0,3}>')
+# 原始 HTML block 可以跨过空行, 有的话整篇一起渲染
+HTML_BLOCK_RE = re.compile(r'^ {0,3}<')
+# [id]: url 这样的引用定义对整篇文档生效, 有的话整篇一起渲染
+REFERENCE_RE = re.compile(r'^ {0,3}\[[^\]]+\]:\s', re.MULTILINE)
+
+MARKDOWN_HTML_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Code Block Example</title>
+    <style>
+        pre code {
+            font-family: 'Courier New', Courier, monospace;
+            border: 1px solid #ccc;
+            border-radius: 3px;
+            padding: 2px 5px;
+            color: #c7254e;
+            white-space: pre-wrap;
+            word-wrap: break-word;
+        }
+    </style>
+</head>
+<body>
+"""
+MARKDOWN_HTML_TAIL = """
+</body>
+</html>
+"""
+
+
+def markdown_document(body):
+    return MARKDOWN_HTML_HEAD + body + MARKDOWN_HTML_TAIL
+
+
+def split_blocks(text):
+    """按空行切成顶层 block, 只在 Python-Markdown 的 block 解析不会跨过去的空行处切开; 返回 None 表示要整篇一起渲染
+
+    - fenced code 当作一行, 里面的空行不切
+    - 缩进的行 (列表项的续行, 代码块) 接在前面的 block 上; 以缩进的行结尾的 block (代码块会吸收后面的空行) 也不切开
+    - 列表项接在有列表项的 block 上 (宽松列表), > 引用接在有引用的 block 上 (连续的引用, 懒惰续行)
+    - 只有空白字符 (全角空格等) 的 block 接在前面的 block 上; 开头只有空白的 block 单独渲染是空的, 接上后面的 block
+    - 有原始 HTML block 时返回 None
+    """
+    lines = text.split('\n')
+    # 第一行的行号 -> 最后一行的行号
+    fence_ends = {}
+    line_number = 0
+    position = 0
+    for match in FENCED_BLOCK_RE.finditer(text):
+        line_number += text.count('\n', position, match.start())
+        position = match.end()
+        fence_ends[line_number] = line_number + text.count('\n', match.start(), position)
+        line_number = fence_ends[line_number]
+
+    blocks = []
+    current = []
+    blank_lines = []
+    has_list = has_quote = has_text = False
+    number = 0
+    while number < len(lines):
+        line = lines[number]
+        end = fence_ends.get(number)
+        if end is None:
+            # 和 Python-Markdown 一样, 只有空格/tab 的行是空行, 但第一行不算 (tab 展开后是缩进的代码块)
+            if not line or (number and not line.strip(' \t')):
+                if current:
+                    blank_lines.append(line)
+                number += 1
+                continue
+            if HTML_BLOCK_RE.match(line):
+                return None
+            end = number
+
+        if current and blank_lines:
+            # 只有全角空格之类的行渲染成空段落, 前后的列表/引用照样会合并, 也不切开
+            continues = (not has_text or line[0] in ' \t' or current[-1][0] in ' \t' or not line.strip()
+                         or (has_list and LIST_ITEM_RE.match(line)) or (has_quote and QUOTE_RE.match(line)))
+            if continues:
+                current.extend(blank_lines)
+            else:
+                blocks.append('\n'.join(current))
+                current = []
+                has_list = has_quote = has_text = False
+            blank_lines = []
+        current.extend(lines[number:end + 1])
+        has_text = has_text or end > number or bool(line.strip())
+        if end == number:
+            has_list = has_list or LIST_ITEM_RE.match(line) is not None
+            has_quote = has_quote or QUOTE_RE.match(line) is not None
+        number = end + 1
+
+    if current:
+        # 结尾的空行也留着, 和整篇渲染时一样
+        blocks.append('\n'.join(current + blank_lines))
+    return blocks
+
+
+class MarkdownBlockCache:
+    """复用同一个 markdown.Markdown 转换器, 每个顶层 block 的 HTML 按 block 的原文缓存
+
+    改一个段落时只有这个段落需要重新转换, 其它 block 直接用缓存. 当前文档的 block 总是都留在缓存里,
+    max_entries 是在这之外给其它文档 (切换过的 snippet, 改之前的段落) 留的条目数.
+    转换器不是线程安全的, 只在一个线程里用.
+    """
+
+    def __init__(self, max_entries=4096):
+        self.converter = markdown.Markdown(extensions=['fenced_code'])
+        self.max_entries = max_entries
+        self.blocks = OrderedDict()  # block 原文 -> HTML
+        self.hits = 0
+        self.misses = 0
+
+    def convert(self, text):
+        self.converter.reset()
+        return self.converter.convert(text)
+
+    def render(self, text, is_cancelled=None):
+        """返回 HTML body; is_cancelled() 返回 True 时中止并返回 None"""
+        chunks = None if REFERENCE_RE.search(text) else split_blocks(text)
+        if chunks is None:
+            return self.convert(text)
+
+        parts = []
+        blocks = self.blocks
+        # 按文档顺序遍历, 上限比 block 数小的话每次都会把自己前面的 block 挤出去
+        max_entries = len(chunks) + self.max_entries
+        for block in chunks:
+            html = blocks.get(block)
+            if html is None:
+                if is_cancelled is not None and is_cancelled():
+                    return None
+                html = self.convert(block)
+                blocks[block] = html
+                self.misses += 1
+                if len(blocks) > max_entries:
+                    blocks.popitem(last=False)
+            else:
+                blocks.move_to_end(block)
+                self.hits += 1
+            if html:
+                parts.append(html)
+        return '\n'.join(parts)
+
+
+class MarkdownRenderWorker(QObject, BackgroundWorker):
+    """在后台线程渲染 Markdown 预览, 只保留最新的一个请求; 结果通过 rendered 信号回到界面线程"""
+
+    # generation, 完整的 HTML
+    rendered = pyqtSignal(int, str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cache = MarkdownBlockCache()
+        self.start_thread('MarkdownRenderWorker')
+
+    def submit(self, text):
+        return self.post(text)
+
+    def handle(self, request):
+        generation, text = request
+        body = self.cache.render(text, lambda: self.is_stale(generation))
+        if body is not None:
+            self.rendered.emit(generation, markdown_document(body))
+
+
+def benchmark(paragraph_count=2000, edits=20):
+    # python markdown_renderer.py [paragraph_count]
+    sections = []
+    for i in range(paragraph_count):
+        if i % 10 == 0:
+            sections.append(f'## Section {i}')
+        elif i % 10 == 5:
+            sections.append(f'```bash\nssh root@db{i} -p 22\n\necho done {i}\n```')
+        elif i % 10 == 7:
+            sections.append(f'- item {i}\n- item {i + 1}\n\n- loose item {i + 2}')
+        else:
+            sections.append(f'Paragraph {i} with **bold** text, `code` and a [link](http://example.com/{i}).')
+    text = '\n\n'.join(sections)
+
+    start = time.perf_counter()
+    markdown.markdown(text, extensions=['fenced_code'])
+    full_once = time.perf_counter() - start
+
+    cache = MarkdownBlockCache()
+    start = time.perf_counter()
+    cache.render(text)
+    first = time.perf_counter() - start
+
+    middle = len(sections) // 2
+    full_total = 0.0
+    cached_total = 0.0
+    for i in range(edits):
+        # 每次修改中间的一个段落
+        sections[middle + 1] = f'Paragraph edited {i} with **bold** text.'
+        edited = '\n\n'.join(sections)
+        start = time.perf_counter()
+        expected = markdown.markdown(edited, extensions=['fenced_code'])
+        full_total += time.perf_counter() - start
+        start = time.perf_counter()
+        result = cache.render(edited)
+        cached_total += time.perf_counter() - start
+    assert result.replace('\n', '') == expected.replace('\n', '')
+    print(f'{paragraph_count} blocks: markdown.markdown {full_once * 1000:.0f} ms, first cached render {first * 1000:.0f} ms')
+    print(f'edit one paragraph x{edits}: markdown.markdown {full_total / edits * 1000:.1f} ms, '
+          f'cached blocks {cached_total / edits * 1000:.1f} ms ({cache.misses} conversions, {cache.hits} hits)')
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,154 @@
+import re
+import sys
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+PLACEHOLDER_RE = re.compile(r'\$\w+')
+NO_PLACEHOLDERS = ()
+
+
+class PlaceholderIndex(QObject):
+    """document 里每个 block (行) 的 $placeholder, 跟着 contentsChange 增量更新
+
+    每次修改只重新扫描受影响的 block. 修改前后这些 block 的 placeholder 一样时 (绝大多数按键) 到此为止;
+    否则更新每个名字的出现次数, 再按第一次出现的顺序算出去重后的列表, 和之前不一样时才发 placeholders_changed.
+    """
+
+    # 去重后的 placeholder, 按第一次出现的顺序
+    placeholders_changed = pyqtSignal(list)
+
+    def __init__(self, document, parent=None):
+        super().__init__(parent)
+        self.document = document
+        self.block_placeholders = []  # block 号 -> tuple(placeholder)
+        self.counts = {}
+        self.unique = []
+        self.block_count = 0
+        # 每次文档修改加一, 给编译好的模板 (PlaceholderTemplate) 判断内容有没有变
+        self.revision = 0
+        self.rescan()
+        document.contentsChange.connect(self.on_contents_change)
+
+    def placeholders(self):
+        return list(self.unique)
+
+    def rescan(self):
+        self.block_placeholders = []
+        self.counts = {}
+        self.block_count = 0
+        self.on_contents_change(0, 0, self.document.characterCount())
+
+    def scan_block(self, block):
+        found = PLACEHOLDER_RE.findall(block.text())
+        return tuple(found) if found else NO_PLACEHOLDERS
+
+    def on_contents_change(self, position, removed, added):
+        self.revision += 1
+        document = self.document
+        first_block = document.findBlock(position)
+        last_block = document.findBlock(min(position + added, document.characterCount() - 1))
+        first = first_block.blockNumber()
+        last = last_block.blockNumber()
+        # 修改前的 [first, old_last] 变成了现在的 [first, last]
+        old_last = last - (document.blockCount() - self.block_count)
+        self.block_count = document.blockCount()
+
+        new_entries = []
+        block = first_block
+        while block.isValid() and block.blockNumber() <= last:
+            new_entries.append(self.scan_block(block))
+            block = block.next()
+        old_entries = self.block_placeholders[first:old_last + 1]
+        self.block_placeholders[first:old_last + 1] = new_entries
+        if old_entries == new_entries:
+            return
+
+        counts = self.counts
+        names_changed = False
+        for entry in old_entries:
+            for name in entry:
+                counts[name] -= 1
+                if counts[name] == 0:
+                    del counts[name]
+                    names_changed = True
+        for entry in new_entries:
+            for name in entry:
+                if name not in counts:
+                    counts[name] = 0
+                    names_changed = True
+                counts[name] += 1
+        if not names_changed and len(counts) < 2:
+            # 名字没有增减时, 至少有两个名字顺序才可能变
+            return
+
+        unique = self.ordered_names(len(counts))
+        if unique != self.unique:
+            self.unique = unique
+            self.placeholders_changed.emit(list(unique))
+
+    def ordered_names(self, count):
+        # 只看有 placeholder 的 block, 所有名字都找到就停
+        unique = []
+        seen = set()
+        for entry in self.block_placeholders:
+            if not entry:
+                continue
+            for name in entry:
+                if name not in seen:
+                    seen.add(name)
+                    unique.append(name)
+            if len(unique) == count:
+                break
+        return unique
+
+
+def benchmark(line_count=10000, keystrokes=200):
+    # python placeholder_index.py [line_count]
+    from PyQt5.QtWidgets import QApplication, QPlainTextEdit
+    from PyQt5.QtGui import QTextCursor
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    lines = [f'line {i} ssh $user@$host -p $port{i % 7} && echo done' if i % 50 == 0 else f'plain line {i} of text'
+             for i in range(line_count)]
+    text = '\n'.join(lines)
+
+    def full_scan(document):
+        # 原来每次按键的做法: 整个文档 toPlainText + findall + list 去重
+        placeholders = re.findall(r'\$\w+', document.toPlainText())
+        unique = []
+        for placeholder in placeholders:
+            if placeholder not in unique:
+                unique.append(placeholder)
+        return unique
+
+    for name in ('full rescan', 'incremental'):
+        editor = QPlainTextEdit()
+        editor.setPlainText(text)
+        document = editor.document()
+        index = PlaceholderIndex(document) if name == 'incremental' else None
+        rebuilds = []
+        if index is not None:
+            index.placeholders_changed.connect(rebuilds.append)
+        cursor = QTextCursor(document)
+        cursor.setPosition(document.findBlockByNumber(line_count // 2).position())
+        start = time.perf_counter()
+        for i in range(keystrokes):
+            # 在文档中间打字, 中间有一次打出新的 placeholder 再删掉
+            cursor.insertText('$new' if i == keystrokes // 2 else 'x')
+            if i == keystrokes // 2 + 1:
+                cursor.movePosition(QTextCursor.Left, QTextCursor.KeepAnchor, 5)
+                cursor.removeSelectedText()
+            if index is None:
+                unique = full_scan(document)
+        elapsed = time.perf_counter() - start
+        if index is not None:
+            unique = index.placeholders()
+            assert unique == full_scan(document)
+        print(f'{name:12s} {line_count} lines: {elapsed / keystrokes * 1000:.3f} ms per keystroke, '
+              f'{len(unique)} placeholders, {len(rebuilds)} grid rebuilds')
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
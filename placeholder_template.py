@@ -0,0 +1,154 @@
+import re
+import sys
+import time
+
+from placeholder_index import PLACEHOLDER_RE
+
+
+# split 时保留 placeholder 本身
+PLACEHOLDER_SPLIT_RE = re.compile(f'({PLACEHOLDER_RE.pattern})')
+
+
+def document_length(text):
+    # QTextDocument 的位置按 UTF-16 计算, BMP 以外的字符 (emoji) 占两个
+    return len(text) if text.isascii() else len(text.encode('utf-16-le')) // 2
+
+
+class PlaceholderTemplate:
+    """把内容按 $placeholder 切成片段, 编译一次, 之后每次渲染只是把值填进对应的片段再 join
+
+    token 用和 PlaceholderIndex 一样的 \\$\\w+: 贪婪匹配到词尾, $hostname 不会被当成 $host 加 name,
+    和 str.replace 逐个替换不同, 结果也不依赖 placeholder 的顺序.
+    """
+
+    def __init__(self, text):
+        # 偶数下标是原样输出的文字, 奇数下标是 placeholder
+        self.parts = PLACEHOLDER_SPLIT_RE.split(text)
+        self.slots = {}  # placeholder -> 在 parts 里的下标
+        for position in range(1, len(self.parts), 2):
+            self.slots.setdefault(self.parts[position], []).append(position)
+
+    def render(self, values, replacement_fmt=None):
+        """values: {placeholder: value}; 值为空的 placeholder 原样保留"""
+        parts = list(self.parts)
+        for placeholder, value in values.items():
+            if not value:
+                continue
+            positions = self.slots.get(placeholder)
+            if positions is None:
+                continue
+            replacement = replacement_fmt.format(value) if replacement_fmt is not None else value
+            for position in positions:
+                parts[position] = replacement
+        return ''.join(parts)
+
+    def render_ranges(self, values):
+        """不加格式地填值, 返回 (结果, [(位置, 长度)]): 每个填进去的值在结果 (QTextDocument) 里的位置"""
+        parts = list(self.parts)
+        filled = []
+        for placeholder, value in values.items():
+            if not value:
+                continue
+            positions = self.slots.get(placeholder)
+            if positions is None:
+                continue
+            for position in positions:
+                parts[position] = value
+            filled.extend(positions)
+        filled.sort()
+
+        ranges = []
+        offset = 0
+        previous = 0
+        for position in filled:
+            offset += sum(map(document_length, parts[previous:position]))
+            length = document_length(parts[position])
+            ranges.append((offset, length))
+            offset += length
+            previous = position + 1
+        return ''.join(parts), ranges
+
+
+class TemplateRenderer:
+    """按内容的 revision 缓存编译好的模板, 按 (revision, values, replacement_fmt) 缓存上一次的结果"""
+
+    def __init__(self):
+        self.revision = None
+        self.template = None
+        self.last_key = None
+        self.last_result = None
+
+    def compile(self, revision, get_text):
+        # get_text() 只在 revision 变了的时候才调用 (toPlainText 要复制整个文档)
+        if revision != self.revision or self.template is None:
+            self.template = PlaceholderTemplate(get_text())
+            self.revision = revision
+            self.last_key = None
+        return self.template
+
+    def render(self, revision, get_text, values, replacement_fmt=None):
+        return self.render_cached(revision, get_text, values, replacement_fmt, False)
+
+    def render_ranges(self, revision, get_text, values):
+        """返回 (结果, 值的位置), 见 PlaceholderTemplate.render_ranges"""
+        return self.render_cached(revision, get_text, values, None, True)
+
+    def render_cached(self, revision, get_text, values, replacement_fmt, with_ranges):
+        key = (revision, tuple(values.items()), replacement_fmt, with_ranges)
+        if key == self.last_key:
+            return self.last_result
+        template = self.compile(revision, get_text)
+        result = template.render_ranges(values) if with_ranges else template.render(values, replacement_fmt)
+        self.last_key = key
+        self.last_result = result
+        return result
+
+
+def replace_each(code, values, replacement_fmt=None):
+    # 原来的做法: 每个 placeholder 对整个内容 str.replace 一遍
+    for placeholder, replacement in values.items():
+        if replacement:
+            code = code.replace(placeholder, replacement_fmt.format(replacement) if replacement_fmt else replacement)
+    return code
+
+
+def benchmark(line_count=10000, placeholder_count=20, renders=50):
+    # python placeholder_template.py [line_count]
+    # 名字等长, 没有互为前缀的, 两种做法结果一样
+    names = [f'$name{i:03d}' for i in range(placeholder_count)]
+    text = '\n'.join(f'echo {names[i % placeholder_count]} line {i} {names[(i * 7) % placeholder_count]}'
+                     for i in range(line_count))
+    values = {name: f'value{i}' for i, name in enumerate(names)}
+
+    start = time.perf_counter()
+    for _ in range(renders):
+        expected = replace_each(text, values)
+    replace_elapsed = (time.perf_counter() - start) / renders
+
+    start = time.perf_counter()
+    template = PlaceholderTemplate(text)
+    compile_elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(renders):
+        result = template.render(values)
+    render_elapsed = (time.perf_counter() - start) / renders
+    assert result == expected
+
+    renderer = TemplateRenderer()
+    renderer.render(1, lambda: text, values)
+    start = time.perf_counter()
+    for _ in range(renders):
+        renderer.render(1, lambda: text, values)
+    cached_elapsed = (time.perf_counter() - start) / renders
+    print(f'{line_count} lines, {placeholder_count} placeholders: str.replace per placeholder '
+          f'{replace_elapsed * 1000:.2f} ms, compile once {compile_elapsed * 1000:.2f} ms + render '
+          f'{render_elapsed * 1000:.2f} ms, unchanged (cached) {cached_elapsed * 1e6:.1f} us')
+
+    # $host 是 $hostname 的前缀: 逐个 replace 的结果取决于顺序
+    prefix_values = {'$host': 'db01', '$hostname': 'db01.example.com'}
+    print('prefix: replace', repr(replace_each('ssh $hostname # $host', prefix_values)),
+          'template', repr(PlaceholderTemplate('ssh $hostname # $host').render(prefix_values)))
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,222 @@
+import sys
+import time
+from bisect import bisect_left, bisect_right
+
+from PyQt5.QtCore import QPoint
+from PyQt5.QtGui import QColor, QTextCharFormat, QTextCursor
+from PyQt5.QtWidgets import QTextEdit
+
+
+def value_format():
+    # 填进去的值: 洋红; ExtraSelection 只叠加颜色, 不会按加粗的字体重新排版, 所以不加粗
+    _format = QTextCharFormat()
+    _format.setForeground(QColor('magenta'))
+    return _format
+
+
+class PreviewPatcher:
+    """预览按行 (= document 的 block) 和上一次写进去的内容比较, 只替换中间变化的那几个 block
+
+    去掉相同的头尾之后剩下的行用一个 QTextCursor 编辑块替换, 没变的 block 不重新排版,
+    highlighter 也只重新高亮被替换的 block; 视图的滚动位置不受影响.
+    第一次或者 document 被别人改过 (block 数对不上) 时整体重新加载.
+    mark_ranges 标出的范围 (Plain text 填进去的值) 只给可见区域内的建 ExtraSelection, 滚动时再补;
+    下一次修改 document 之前先清掉, 否则每次修改都要更新这些 cursor.
+    """
+
+    def __init__(self, editor):
+        self.editor = editor
+        self.lines = None  # 上一次写进去的行
+        self.value_format = value_format()
+        self.ranges = []  # [(位置, 长度)], 按位置排序
+        self.marked = False
+        self.loaded = False  # 还是同一个 snippet 的预览, 整体重新加载时保留滚动位置
+        for scroll_bar in (editor.verticalScrollBar(), editor.horizontalScrollBar()):
+            scroll_bar.valueChanged.connect(self.mark_visible_ranges)
+            scroll_bar.rangeChanged.connect(self.mark_visible_ranges)
+
+    def reset(self):
+        # 换了 snippet: 下一次整体加载, 从头开始显示
+        self.clear_marks()
+        self.lines = None
+        self.loaded = False
+
+    def set_loaded(self, lines):
+        """document 已经由别人 (例如分块加载) 写成了 lines"""
+        self.lines = lines
+        self.loaded = True
+
+    def set_html(self, html):
+        """不能按行替换的预览 (Markdown), 整体替换"""
+        self.clear_marks()
+        self.replace_document(lambda: self.editor.setHtml(html))
+        self.lines = None
+
+    def mark_ranges(self, ranges):
+        """ranges: [(位置, 长度)] 按位置排序, 用 ExtraSelections 标出来, 不改 document"""
+        self.ranges = ranges
+        self.mark_visible_ranges()
+
+    def clear_marks(self):
+        self.ranges = []
+        if self.marked:
+            self.editor.setExtraSelections([])
+            self.marked = False
+
+    def mark_visible_ranges(self, *args):
+        if not self.ranges and not self.marked:
+            return
+        editor = self.editor
+        viewport = editor.viewport()
+        # 贴着边缘 (document 的 margin 里) 的 hitTest 不可靠, 取 margin 里面一点的位置
+        margin = int(editor.document().documentMargin()) + 1
+        first = editor.cursorForPosition(QPoint(margin, margin)).block().position()
+        last_block = editor.cursorForPosition(QPoint(viewport.width(), viewport.height())).block()
+        last = last_block.position() + last_block.length()
+        ranges = self.ranges
+        # 前一个范围可能跨过 first
+        start = max(bisect_left(ranges, (first,)) - 1, 0)
+        end = bisect_right(ranges, (last,))
+
+        document = editor.document()
+        selections = []
+        for position, length in ranges[start:end]:
+            # 先设好位置再赋给 selection.cursor; 通过 selection.cursor 调用会形成引用环, cursor 要等 gc 才释放,
+            # 在那之前 document 的每次修改都要更新这些 cursor
+            cursor = QTextCursor(document)
+            cursor.setPosition(position)
+            cursor.setPosition(position + length, QTextCursor.KeepAnchor)
+            selection = QTextEdit.ExtraSelection()
+            selection.cursor = cursor
+            selection.format = self.value_format
+            selections.append(selection)
+        editor.setExtraSelections(selections)
+        self.marked = bool(selections)
+
+    def update(self, lines):
+        """lines: 预览的每一行 (纯文本); 返回重新写入的行数. 之前标出的范围被清掉, 需要的话重新 mark_ranges"""
+        self.clear_marks()
+        document = self.editor.document()
+        old = self.lines
+        if old is None or document.blockCount() != len(old):
+            self.load(lines)
+            return len(lines)
+
+        prefix = 0
+        common = min(len(old), len(lines))
+        while prefix < common and old[prefix] == lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < common - prefix and old[-1 - suffix] == lines[-1 - suffix]:
+            suffix += 1
+        old_end = len(old) - suffix
+        new_end = len(lines) - suffix
+        if prefix == old_end and prefix == new_end:
+            return 0
+        if (new_end - prefix) * 2 > len(lines):
+            # 大部分行都变了 (例如每行都有的值被修改): 整体加载比逐行替换快, 滚动位置同样保留
+            self.load(lines)
+            return len(lines)
+
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        if prefix < old_end:
+            # 选中要替换的 block; 只删不加时连同前后的换行一起删掉
+            start = document.findBlockByNumber(prefix)
+            end = document.findBlockByNumber(old_end - 1)
+            if prefix == new_end and old_end < len(old):
+                cursor.setPosition(start.position())
+                cursor.setPosition(document.findBlockByNumber(old_end).position(), QTextCursor.KeepAnchor)
+            elif prefix == new_end and prefix > 0:
+                cursor.setPosition(start.previous().position() + start.previous().length() - 1)
+                cursor.setPosition(end.position() + end.length() - 1, QTextCursor.KeepAnchor)
+            else:
+                cursor.setPosition(start.position())
+                cursor.setPosition(end.position() + end.length() - 1, QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+            self.insert_lines(cursor, lines[prefix:new_end], False, False)
+        elif prefix < len(old):
+            # 在第 prefix 个 block 前面插入新的行
+            cursor.setPosition(document.findBlockByNumber(prefix).position())
+            self.insert_lines(cursor, lines[prefix:new_end], False, True)
+        else:
+            # 加在最后
+            cursor.movePosition(QTextCursor.End)
+            self.insert_lines(cursor, lines[prefix:new_end], True, False)
+        cursor.endEditBlock()
+        self.lines = lines
+        return new_end - prefix
+
+    def insert_lines(self, cursor, lines, block_before, block_after):
+        for number, line in enumerate(lines):
+            if number or block_before:
+                cursor.insertBlock()
+            cursor.insertText(line)
+        if block_after:
+            cursor.insertBlock()
+
+    def load(self, lines):
+        text = '\n'.join(lines)
+        self.replace_document(lambda: self.editor.setPlainText(text))
+        self.lines = lines
+
+    def replace_document(self, replace):
+        # 整体重新加载; 还是同一个预览时保留滚动位置
+        vertical = self.editor.verticalScrollBar().value()
+        horizontal = self.editor.horizontalScrollBar().value()
+        replace()
+        if self.loaded:
+            self.editor.verticalScrollBar().setValue(vertical)
+            self.editor.horizontalScrollBar().setValue(horizontal)
+        self.loaded = True
+
+
+def html_preview(template, values):
+    # 原来 Plain text 的做法: 值包在 <span> 里, 整个内容放进 <p> 再 setHtml, 内容没有转义
+    code = template.render(values, '<span style="color: magenta; font-weight: bold;">{}</span>')
+    return f'<p style="white-space: pre-wrap; color: green;">{code}</p>'
+
+
+def benchmark(body_size=1024 * 1024, keystrokes=5):
+    # python preview_patcher.py [body_size]
+    from PyQt5.QtWidgets import QApplication
+    from placeholder_template import PlaceholderTemplate
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    line = 'ssh $user@$host -p 22 && grep title index.html | sed s/amp/x/g  # done'
+    template = PlaceholderTemplate('\n'.join(f'{line} {i}' for i in range(body_size // len(line))))
+    values = {'$user': 'root', '$host': 'db01'}
+
+    for name in ('HTML', 'plain text'):
+        editor = QTextEdit()
+        editor.resize(600, 400)
+        editor.show()
+        patcher = PreviewPatcher(editor)
+        elapsed = []
+        for i in range(keystrokes + 1):
+            # 第一次是加载, 之后每次在 $host 的输入框里打一个字, 每一行都要变
+            values['$host'] = 'db01' + 'x' * i
+            start = time.perf_counter()
+            if name == 'HTML':
+                editor.setHtml(html_preview(template, values))
+            else:
+                code, ranges = template.render_ranges(values)
+                patcher.update(code.split('\n'))
+                patcher.mark_ranges(ranges)
+            app.processEvents()
+            elapsed.append(time.perf_counter() - start)
+        print(f'{name:10s} {len(template.render(values)) / 1024 / 1024:.1f} MB: load {elapsed[0] * 1000:.0f} ms, '
+              f'{sum(elapsed[1:]) / keystrokes * 1000:.0f} ms per keystroke, {len(editor.extraSelections())} marks')
+
+    # 内容里的 < 和 & 在 HTML 里会被当成标记
+    template = PlaceholderTemplate('grep "<title>" $file | sed "s/&amp;/\\&/g"')
+    values = {'$file': 'index.html'}
+    editor = QTextEdit()
+    editor.setHtml(html_preview(template, values))
+    print('HTML      ', repr(editor.toPlainText()))
+    PreviewPatcher(editor).update(template.render_ranges(values)[0].split('\n'))
+    print('plain text', repr(editor.toPlainText()))
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1024 * 1024)
@@ -5,6 +5,8 @@ from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QTextEdit, QShor
 from PyQt5.QtGui import QColor, QTextCharFormat, QFont, QSyntaxHighlighter, QKeySequence, QStandardItemModel, QStandardItem, QIcon, QKeyEvent, QTextCursor
 from PyQt5.QtCore import Qt, QItemSelectionModel, QItemSelection, QSettings, QRegularExpression, QSortFilterProxyModel, QModelIndex, QMimeData, QTimer
 
+from snippet_query import canonical_query
+
 
 class SearchBoxHistory(QComboBox):
     def __init__(self, parent=None):
@@ -18,7 +20,8 @@ class SearchBoxHistory(QComboBox):
         self.setCurrentText('')
     
     def on_save_text(self):
-        keyword = self.currentText().strip()
+        # 字段查询保存成规范写法, 同一个查询只占一条历史
+        keyword = canonical_query(self.currentText())
         if not keyword:
             return
 
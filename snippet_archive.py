@@ -0,0 +1,136 @@
+import os
+import io
+import json
+import zipfile
+
+
+# 从源码目录导入时按扩展名推断类型
+EXTENSION_TYPES = {
+    '.py': 'Python',
+    '.c': 'C++', '.cc': 'C++', '.cpp': 'C++', '.cxx': 'C++', '.h': 'C++', '.hpp': 'C++',
+    '.md': 'Markdown', '.markdown': 'Markdown',
+}
+
+ARCHIVE_MEMBER_NAME = 'snippets.jsonl'
+
+
+def snippet_from_source(title, text):
+    snippet_type = EXTENSION_TYPES.get(os.path.splitext(title)[1].lower(), 'Plain text')
+    return {'type': snippet_type, 'title': title, 'content': text}
+
+
+def iter_source_directory(dir_path):
+    for root, dirs, files in os.walk(dir_path):
+        dirs.sort()
+        for filename in sorted(files):
+            file_path = os.path.join(root, filename)
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    text = f.read()
+            except (UnicodeDecodeError, OSError) as e:
+                print(f"Skip {file_path}: {e}")
+                continue
+            yield snippet_from_source(os.path.relpath(file_path, dir_path), text)
+
+
+def iter_jsonl(lines):
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            snippet = json.loads(line)
+        except ValueError as e:
+            print(f"Skip line {line_number}: {e}")
+            continue
+        if isinstance(snippet, dict):
+            yield snippet
+
+
+def iter_zip(zip_path):
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            with archive.open(info) as raw:
+                if info.filename.endswith('.jsonl'):
+                    yield from iter_jsonl(io.TextIOWrapper(raw, encoding='utf-8'))
+                    continue
+                try:
+                    text = raw.read().decode('utf-8')
+                except UnicodeDecodeError as e:
+                    print(f"Skip {info.filename}: {e}")
+                    continue
+            if info.filename.endswith('.json'):
+                # 原来 data/ 目录里的 snippet_*.json
+                try:
+                    yield json.loads(text)
+                except ValueError as e:
+                    print(f"Skip {info.filename}: {e}")
+            else:
+                yield snippet_from_source(info.filename, text)
+
+
+def iter_import_source(path):
+    """目录 (源码文件), .jsonl 或 .zip"""
+    if os.path.isdir(path):
+        yield from iter_source_directory(path)
+    elif zipfile.is_zipfile(path):
+        yield from iter_zip(path)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from iter_jsonl(f)
+
+
+def import_snippets(store, path, now, batch_size=1000, progress=None):
+    """分批写入 store, 返回 [(key, snippet), ...]; progress(已导入数量) 返回 False 时中止"""
+    imported = []
+    batch = []
+    timestamp = now.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+    def flush():
+        keys = store.add_many(batch, now, start=len(imported))
+        imported.extend(zip(keys, batch))
+        batch.clear()
+        return progress is None or progress(len(imported)) is not False
+
+    for snippet in iter_import_source(path):
+        snippet.pop('file_path', None)
+        snippet.setdefault('type', 'Plain text')
+        snippet.setdefault('title', 'Imported Snippet')
+        snippet.setdefault('content', '')
+        snippet.setdefault('timestamp', timestamp)
+        batch.append(snippet)
+        if len(batch) >= batch_size and not flush():
+            return imported
+
+    if batch:
+        flush()
+    return imported
+
+
+def export_snippets(store, keys, path, progress=None, progress_interval=1000):
+    """按 key 逐个读取并流式写入 .jsonl, 或写入 .zip 里的 snippets.jsonl"""
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(ARCHIVE_MEMBER_NAME, 'w', force_zip64=True) as raw:
+                with io.TextIOWrapper(raw, encoding='utf-8') as f:
+                    return write_jsonl(store, keys, f, progress, progress_interval)
+    with open(path, 'w', encoding='utf-8') as f:
+        return write_jsonl(store, keys, f, progress, progress_interval)
+
+
+def write_jsonl(store, keys, f, progress, progress_interval):
+    exported = 0
+    for key in keys:
+        try:
+            snippet = store.load(key)
+        except Exception as e:
+            print(f"Error loading {key}: {e}")
+            continue
+        f.write(json.dumps(snippet, ensure_ascii=False))
+        f.write('\n')
+        exported += 1
+        if progress is not None and exported % progress_interval == 0 and progress(exported) is False:
+            break
+    return exported
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+
+
+class SnippetCache:
+    """按文件路径缓存已解析的 snippet, 按字节数做 LRU 淘汰, 用 (mtime, size) 判断是否过期"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (version, snippet, size)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return dict(entry[1])
+
+    def put(self, key, version, snippet, size):
+        self.invalidate(key)
+        if size > self.max_bytes:
+            return
+
+        self.entries[key] = (version, dict(snippet), size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def invalidate(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': hit_rate,
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+        }
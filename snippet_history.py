@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import datetime
+import difflib
+import threading
+
+
+def make_delta(old_lines, new_lines):
+    """按行做 diff: ['c', i1, i2] 复制旧版本的行, ['i', lines] 插入新行"""
+    # 先去掉相同的头尾, 只对中间变化的部分跑 SequenceMatcher
+    prefix = 0
+    max_prefix = min(len(old_lines), len(new_lines))
+    while prefix < max_prefix and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    max_suffix = max_prefix - prefix
+    while suffix < max_suffix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+
+    ops = []
+    if prefix:
+        ops.append(['c', 0, prefix])
+
+    old_middle = old_lines[prefix:len(old_lines) - suffix]
+    new_middle = new_lines[prefix:len(new_lines) - suffix]
+    matcher = difflib.SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append(['c', prefix + i1, prefix + i2])
+        elif tag in ('replace', 'insert'):
+            ops.append(['i', new_middle[j1:j2]])
+
+    if suffix:
+        ops.append(['c', len(old_lines) - suffix, len(old_lines)])
+    return ops
+
+
+def apply_delta(old_lines, ops):
+    new_lines = []
+    for op in ops:
+        if op[0] == 'c':
+            new_lines.extend(old_lines[op[1]:op[2]])
+        else:
+            new_lines.extend(op[1])
+    return new_lines
+
+
+class SnippetHistory:
+    """每个 snippet 一个只追加的修订日志 (history/<name>.log, 每行一个 json)
+
+    普通修订只存和上一版的按行 delta, 每 checkpoint_interval 个修订存一次完整内容,
+    恢复任意修订最多回放 checkpoint_interval - 1 个 delta.
+    超过 max_revisions 时从最老的 checkpoint 开始整组丢弃, 自动保存再频繁占用空间也有上限.
+    """
+
+    def __init__(self, history_dir, checkpoint_interval=20, max_revisions=200, min_interval=30.0):
+        self.history_dir = history_dir
+        if not os.path.exists(self.history_dir):
+            os.makedirs(self.history_dir)
+
+        self.checkpoint_interval = checkpoint_interval
+        self.max_revisions = max_revisions
+        # 两次修订之间至少间隔 min_interval 秒, 连续自动保存不会每次都记一版
+        self.min_interval = min_interval
+
+        self.lock = threading.RLock()
+        self.entries = {}  # key -> [(rev, timestamp, kind, offset), ...]
+        self.last_lines = {}  # key -> 最新修订的内容 (按行), 用于计算下一个 delta
+        self.last_meta = {}
+        self.last_record_time = {}
+
+    def log_path(self, key):
+        name = os.path.splitext(os.path.basename(key))[0]
+        return os.path.join(self.history_dir, f'{name}.log')
+
+    def load_entries(self, key):
+        entries = self.entries.get(key)
+        if entries is not None:
+            return entries
+
+        entries = []
+        log_path = self.log_path(key)
+        if os.path.exists(log_path):
+            with open(log_path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        entries.append((record['rev'], record['timestamp'], record['kind'], offset))
+                    except (ValueError, KeyError):
+                        # 最后一行写了一半 (崩溃), 忽略
+                        pass
+                    offset += len(line)
+        self.entries[key] = entries
+        return entries
+
+    def list_revisions(self, key):
+        """[(rev, timestamp, kind), ...], 最新的在最后"""
+        with self.lock:
+            return [(rev, timestamp, kind) for rev, timestamp, kind, _ in self.load_entries(key)]
+
+    def restore(self, key, rev):
+        """返回修订 rev 时的 snippet (dict), 找不到返回 None"""
+        with self.lock:
+            return self.restore_locked(key, rev)[0]
+
+    def restore_locked(self, key, rev):
+        entries = self.load_entries(key)
+        position = next((i for i, entry in enumerate(entries) if entry[0] == rev), None)
+        if position is None:
+            return None, None
+
+        # 从 rev 往前找最近的 checkpoint, 然后只回放中间的 delta
+        start = position
+        while entries[start][2] != 'full':
+            start -= 1
+
+        lines = None
+        meta = None
+        with open(self.log_path(key), 'rb') as f:
+            f.seek(entries[start][3])
+            for _ in range(position - start + 1):
+                record = json.loads(f.readline())
+                if record['kind'] == 'full':
+                    lines = record['lines']
+                else:
+                    lines = apply_delta(lines, record['ops'])
+                meta = record['meta']
+
+        snippet = dict(meta)
+        snippet['content'] = ''.join(lines)
+        return snippet, lines
+
+    def record(self, key, snippet, force=False):
+        with self.lock:
+            now = time.monotonic()
+            last_time = self.last_record_time.get(key)
+            if not force and last_time is not None and now - last_time < self.min_interval:
+                return
+
+            entries = self.load_entries(key)
+            lines = snippet.get('content', '').splitlines(keepends=True)
+            meta = {field: value for field, value in snippet.items() if field not in ('content', 'timestamp')}
+
+            if entries and key not in self.last_lines:
+                last_snippet, self.last_lines[key] = self.restore_locked(key, entries[-1][0])
+                last_snippet.pop('content')
+                self.last_meta[key] = last_snippet
+
+            if entries and self.last_lines.get(key) == lines and self.last_meta.get(key) == meta:
+                return
+
+            rev = entries[-1][0] + 1 if entries else 1
+            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            record = {'rev': rev, 'timestamp': timestamp, 'meta': meta}
+            if not entries or (len(entries) - self.last_checkpoint_position(entries)) >= self.checkpoint_interval:
+                record['kind'] = 'full'
+                record['lines'] = lines
+            else:
+                record['kind'] = 'delta'
+                record['ops'] = make_delta(self.last_lines[key], lines)
+
+            log_path = self.log_path(key)
+            with open(log_path, 'ab') as f:
+                offset = f.tell()
+                f.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+            entries.append((rev, timestamp, record['kind'], offset))
+
+            self.last_lines[key] = lines
+            self.last_meta[key] = meta
+            self.last_record_time[key] = now
+
+            if len(entries) > self.max_revisions:
+                self.compact(key)
+
+    def last_checkpoint_position(self, entries):
+        for position in range(len(entries) - 1, -1, -1):
+            if entries[position][2] == 'full':
+                return position
+        return 0
+
+    def compact(self, key):
+        # 丢掉最老的修订, 保留下来的第一条必须是 checkpoint
+        entries = self.entries[key]
+        keep_from = len(entries) - self.max_revisions
+        while keep_from < len(entries) and entries[keep_from][2] != 'full':
+            keep_from += 1
+        if keep_from >= len(entries):
+            return
+
+        log_path = self.log_path(key)
+        tmp_path = log_path + '.tmp'
+        with open(log_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            src.seek(entries[keep_from][3])
+            while True:
+                data = src.read(1024 * 1024)
+                if not data:
+                    break
+                dst.write(data)
+        os.replace(tmp_path, log_path)
+
+        base = entries[keep_from][3]
+        self.entries[key] = [(rev, timestamp, kind, offset - base)
+                             for rev, timestamp, kind, offset in entries[keep_from:]]
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.last_lines.pop(key, None)
+            self.last_meta.pop(key, None)
+            self.last_record_time.pop(key, None)
+            log_path = self.log_path(key)
+            if os.path.exists(log_path):
+                os.remove(log_path)
@@ -0,0 +1,223 @@
+import re
+import sys
+import time
+import bisect
+import datetime
+from collections import namedtuple
+
+from tree_view_proxy import compile_matcher
+
+
+# type:python title:foo body:bar placeholder:$host after:2025-01-01 before:30d, 前面加 - 表示取反
+QUERY_FIELDS = ('type', 'title', 'body', 'placeholder', 'after', 'before')
+QUERY_TOKEN_RE = re.compile(r'(-?)(\w+):(?:"([^"]*)"|(\S+))|"([^"]*)"|(\S+)')
+RELATIVE_DATE_RE = re.compile(r'^(\d+)([dw])$')
+# title 和自由文本没法用索引估算, 假设能留下这个比例的行
+UNINDEXED_SELECTIVITY = 0.1
+
+QueryTerm = namedtuple('QueryTerm', ['field', 'value', 'negate'])
+
+
+def parse_query(text):
+    """返回 [QueryTerm]; field 为 None 的是普通搜索词"""
+    terms = []
+    for match in QUERY_TOKEN_RE.finditer(text):
+        negate, field, quoted_value, value, quoted_word, word = match.groups()
+        if field is not None and field.lower() in QUERY_FIELDS:
+            value = quoted_value if quoted_value is not None else value
+            terms.append(QueryTerm(field.lower(), value, bool(negate)))
+        elif field is not None:
+            # 不认识的字段, 整个当成普通搜索词 (例如 http://)
+            terms.append(QueryTerm(None, match.group(0), False))
+        else:
+            terms.append(QueryTerm(None, quoted_word if quoted_word is not None else word, False))
+    return terms
+
+
+def is_structured(terms):
+    return any(term.field is not None for term in terms)
+
+
+def canonical_query(text):
+    """保存到搜索历史时用的规范写法, 同一个查询只保存一份"""
+    terms = parse_query(text)
+    if not is_structured(terms):
+        return text.strip()
+    parts = []
+    for term in terms:
+        value = f'"{term.value}"' if ' ' in term.value else term.value
+        if term.field is None:
+            parts.append(value)
+        else:
+            parts.append(f"{'-' if term.negate else ''}{term.field}:{value}")
+    return ' '.join(parts)
+
+
+def parse_date(value, now=None):
+    """'2025-01-01' / '2025-01' 原样返回 (timestamp 字符串按字典序比较), '7d' / '2w' 换算成日期"""
+    match = RELATIVE_DATE_RE.match(value)
+    if match:
+        days = int(match.group(1)) * (7 if match.group(2) == 'w' else 1)
+        now = now or datetime.datetime.now()
+        return (now - datetime.timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+    return value
+
+
+class MetadataIndex:
+    """tree 里所有行的元数据, 按 type 分组并按 timestamp 排序, 用来估算和枚举 type:/after:/before:"""
+
+    def __init__(self, rows):
+        # rows: [(title, type, key, timestamp), ...]
+        self.rows = {}
+        self.keys_by_type = {}
+        timeline = []
+        for title, snippet_type, key, timestamp in rows:
+            folded_type = (snippet_type or '').casefold()
+            self.rows[key] = ((title or '').casefold(), folded_type, timestamp or '')
+            self.keys_by_type.setdefault(folded_type, []).append(key)
+            timeline.append((timestamp or '', key))
+        timeline.sort()
+        self.timestamps = [timestamp for timestamp, _ in timeline]
+        self.timeline_keys = [key for _, key in timeline]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def types_matching(self, value):
+        value = value.casefold()
+        return [snippet_type for snippet_type in self.keys_by_type if value in snippet_type]
+
+    def time_range(self, field, value):
+        # after: timestamp >= value, before: timestamp < value
+        position = bisect.bisect_left(self.timestamps, parse_date(value))
+        return (position, len(self.timestamps)) if field == 'after' else (0, position)
+
+
+class QueryPlanner:
+    """按估算的选择性给查询条件排序: 结果最少的可枚举条件 (body/placeholder/type/after/before) 产生候选,
+    其余条件从结果少到多依次在候选上检查, 没有可枚举条件时才扫描全部行"""
+
+    def __init__(self, metadata, search_index=None, haystacks=None):
+        self.metadata = metadata
+        self.search_index = search_index
+        self.haystacks = haystacks or []
+        self.haystacks_by_key = None
+
+    def plan(self, terms):
+        steps = []
+        for term in terms:
+            steps.append(self.make_step(term))
+        # 没有取反的可枚举条件才能产生候选
+        drivers = [step for step in steps if step['keys'] is not None and not step['term'].negate]
+        driver = min(drivers, key=lambda step: step['estimate']) if drivers else None
+        filters = sorted((step for step in steps if step is not driver), key=lambda step: step['estimate'])
+        return driver, filters
+
+    def make_step(self, term):
+        field = term.field
+        keys = None
+        if field == 'body':
+            keys = self.search_index.search(term.value) if self.search_index is not None else set()
+        elif field == 'placeholder':
+            keys = self.search_index.search_placeholders(term.value) if self.search_index is not None else set()
+        elif field == 'type':
+            keys = [key for snippet_type in self.metadata.types_matching(term.value)
+                    for key in self.metadata.keys_by_type[snippet_type]]
+        elif field in ('after', 'before'):
+            start, end = self.metadata.time_range(field, term.value)
+            keys = self.metadata.timeline_keys[start:end]
+
+        if keys is not None:
+            estimate = len(keys)
+        else:
+            estimate = int(len(self.metadata) * UNINDEXED_SELECTIVITY)
+        if term.negate:
+            estimate = len(self.metadata) - estimate
+        return {'term': term, 'keys': keys, 'estimate': estimate, 'check': self.make_check(term, keys)}
+
+    def make_check(self, term, keys):
+        rows = self.metadata.rows
+        if term.field == 'title':
+            value = term.value.casefold()
+            return lambda key: key in rows and value in rows[key][0]
+        if term.field == 'type':
+            types = set(self.metadata.types_matching(term.value))
+            return lambda key: key in rows and rows[key][1] in types
+        if term.field == 'after':
+            value = parse_date(term.value)
+            return lambda key: key in rows and rows[key][2] >= value
+        if term.field == 'before':
+            value = parse_date(term.value)
+            return lambda key: key in rows and rows[key][2] < value
+        if keys is not None:
+            return keys.__contains__
+
+        # 普通搜索词: 和原来的搜索框一样匹配 tree 的各列, 或者正文命中
+        if self.haystacks_by_key is None:
+            self.haystacks_by_key = {haystack[2]: haystack for haystack in self.haystacks if haystack}
+        haystacks_by_key = self.haystacks_by_key
+        matcher = compile_matcher(term.value)
+        body_keys = self.search_index.search(term.value) if self.search_index is not None else set()
+
+        def check(key):
+            if key in body_keys:
+                return True
+            haystack = haystacks_by_key.get(key)
+            return haystack is not None and matcher(haystack)
+        return check
+
+    def explain(self, terms):
+        """执行顺序和每一步估算的结果数, 例如 body:docker~120 -> type:python~25000"""
+        driver, filters = self.plan(terms)
+        return ' -> '.join(
+            f"{'-' if step['term'].negate else ''}{step['term'].field or 'text'}:{step['term'].value}~{step['estimate']}"
+            for step in ([driver] if driver else []) + filters)
+
+    def execute(self, terms, is_cancelled=None):
+        driver, filters = self.plan(terms)
+        candidates = driver['keys'] if driver is not None else list(self.metadata.rows)
+        checks = [(step['check'], step['term'].negate) for step in filters]
+
+        accepted = set()
+        for count, key in enumerate(candidates):
+            if is_cancelled is not None and count % 4096 == 0 and is_cancelled():
+                return None
+            for check, negate in checks:
+                if check(key) == negate:
+                    break
+            else:
+                accepted.add(key)
+        return accepted
+
+
+def benchmark(row_count=100000):
+    # python snippet_query.py [row_count]
+    import random
+    from snippet_search_index import SnippetSearchIndex
+    random.seed(0)
+    types = ['Python', 'C++', 'Markdown', 'Plain text']
+    words = [f'word{i}' for i in range(5000)] + ['docker', 'compose', 'kubectl']
+    rows = []
+    index = SnippetSearchIndex()
+    items = []
+    for i in range(row_count):
+        key = f'data/snippet_{i:08d}.json'
+        timestamp = f'2025-{1 + i % 12:02d}-{1 + i % 28:02d} 00:00:00.000'
+        rows.append((f'title {i}', types[i % 4], key, timestamp))
+        content = ' '.join(random.choice(words) for _ in range(30))
+        items.append((key, {'content': content, f'$host{i % 50}': 'db01'}))
+    index.build(items)
+    metadata = MetadataIndex(rows)
+
+    for query in ('type:python body:docker after:2025-09-01', 'body:docker type:python title:1',
+                  'placeholder:$host7 -type:markdown', 'type:python title:"title 99"', 'title:4212'):
+        terms = parse_query(query)
+        planner = QueryPlanner(metadata, index)
+        start = time.perf_counter()
+        keys = planner.execute(terms)
+        print(f'{query!r:45s} {(time.perf_counter() - start) * 1000:7.2f} ms  {len(keys)} snippets')
+        print(f'    plan {planner.explain(terms)}')
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
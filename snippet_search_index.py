@@ -0,0 +1,219 @@
+import re
+import sys
+import time
+import threading
+from array import array
+
+
+TOKEN_RE = re.compile(r'\w+')
+# placeholder 名字 ($host) 单独作为带 $ 的 token 索引, 给 placeholder: 查询用
+PLACEHOLDER_RE = re.compile(r'\$\w+')
+# 短于 3 个字符的查询词没有 trigram, 只做整词匹配
+MIN_SUBSTRING_LENGTH = 3
+
+
+def snippet_text(snippet):
+    """参与全文检索的文本: content 和保存下来的 $placeholder 值"""
+    values = [str(value) for field, value in snippet.items() if field.startswith('$') and value]
+    return '\n'.join([snippet.get('content', '')] + values)
+
+
+def trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SnippetSearchIndex:
+    """snippet 正文的倒排索引
+
+    token -> 包含它的 snippet (doc id 数组), 另外对词表建 trigram -> token, 子串查询先用 trigram 在词表里
+    找出包含查询词的 token, 再合并这些 token 的 posting. 只索引词表而不是全文的 trigram, 内存和 token 数成正比.
+    查询词都按 casefold 比较; 正则查询对词表里的每个 token 做匹配.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.doc_ids = {}  # key -> doc id
+        self.doc_keys = {}  # doc id -> key
+        self.doc_tokens = {}  # doc id -> tuple(token), 删除/更新时用; 用 tuple 而不是 set, 省内存
+        self.postings = {}  # token -> array(doc id); 比 set 省一个数量级的内存, 删除时 remove 是 C 里的 memmove
+        self.token_trigrams = {}  # trigram -> set(token)
+        self.next_doc_id = 0
+
+        # 后台建索引时, 界面线程更新过的 key 以界面线程为准
+        self.serial = 0
+        self.updated_serial = {}
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def tokenize(self, snippet):
+        # 先去重再 intern, 同一个 token 在所有 posting 和 doc_tokens 里共用一个字符串
+        tokens = set(TOKEN_RE.findall(snippet_text(snippet).casefold()))
+        tokens.update(PLACEHOLDER_RE.findall(snippet.get('content', '').casefold()))
+        tokens.update(field.casefold() for field in snippet if field.startswith('$'))
+        return tuple(map(sys.intern, tokens))
+
+    def update(self, key, snippet):
+        tokens = self.tokenize(snippet)
+        with self.lock:
+            self.serial += 1
+            self.updated_serial[key] = self.serial
+            self.set_tokens(key, tokens)
+
+    def update_many(self, items, since_serial=None):
+        """items: [(key, snippet), ...]; since_serial 不为 None 时跳过之后被 update/remove 过的 key"""
+        tokenized = [(key, self.tokenize(snippet)) for key, snippet in items]
+        with self.lock:
+            for key, tokens in tokenized:
+                if since_serial is not None and self.updated_serial.get(key, 0) > since_serial:
+                    continue
+                self.set_tokens(key, tokens)
+
+    def remove(self, key):
+        with self.lock:
+            self.serial += 1
+            self.updated_serial[key] = self.serial
+            self.set_tokens(key, None)
+
+    def set_tokens(self, key, tokens):
+        doc_id = self.doc_ids.get(key)
+        old_tokens = set(self.doc_tokens[doc_id]) if doc_id is not None else set()
+        if tokens is None:
+            if doc_id is None:
+                return
+            del self.doc_ids[key]
+            del self.doc_keys[doc_id]
+            del self.doc_tokens[doc_id]
+            new_tokens = set()
+        else:
+            if doc_id is None:
+                doc_id = self.next_doc_id
+                self.next_doc_id += 1
+                self.doc_ids[key] = doc_id
+                self.doc_keys[doc_id] = key
+            self.doc_tokens[doc_id] = tokens
+            new_tokens = set(tokens) if old_tokens else tokens
+
+        for token in old_tokens.difference(new_tokens):
+            posting = self.postings[token]
+            posting.remove(doc_id)
+            if not posting:
+                # 词表里不再有这个 token
+                del self.postings[token]
+                for trigram in trigrams(token):
+                    trigram_tokens = self.token_trigrams[trigram]
+                    trigram_tokens.discard(token)
+                    if not trigram_tokens:
+                        del self.token_trigrams[trigram]
+
+        for token in (new_tokens.difference(old_tokens) if old_tokens else new_tokens):
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = array('I')
+                for trigram in trigrams(token):
+                    self.token_trigrams.setdefault(trigram, set()).add(token)
+            posting.append(doc_id)
+
+    def build(self, items):
+        """后台线程调用; 返回索引的 snippet 数量"""
+        with self.lock:
+            since_serial = self.serial
+        count = 0
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= 1000:
+                self.update_many(batch, since_serial)
+                count += len(batch)
+                batch = []
+        self.update_many(batch, since_serial)
+        return count + len(batch)
+
+    def matching_tokens(self, term):
+        if len(term) < MIN_SUBSTRING_LENGTH:
+            return [term] if term in self.postings else []
+
+        candidates = None
+        for trigram in sorted(trigrams(term), key=lambda t: len(self.token_trigrams.get(t, ()))):
+            tokens = self.token_trigrams.get(trigram)
+            if not tokens:
+                return []
+            candidates = set(tokens) if candidates is None else candidates & tokens
+            if not candidates:
+                return []
+        return [token for token in candidates if term in token]
+
+    def docs_for_tokens(self, tokens):
+        docs = set()
+        for token in tokens:
+            docs.update(self.postings[token])
+        return docs
+
+    def search_placeholders(self, name):
+        """定义了名字里包含 name 的 placeholder 的 key 集合 (name 可以带也可以不带 $)"""
+        term = '$' + name.casefold().lstrip('$')
+        with self.lock:
+            tokens = [token for token in self.matching_tokens(term) if token.startswith('$')]
+            return {self.doc_keys[doc_id] for doc_id in self.docs_for_tokens(tokens)}
+
+    def search(self, query, regex=False):
+        """返回正文匹配的 key 集合; 每个查询词都要出现在某个 token 里 (子串), 正则匹配任一 token 即可"""
+        with self.lock:
+            if regex:
+                try:
+                    search = re.compile(query, re.IGNORECASE).search
+                except re.error:
+                    return set()
+                tokens = [token for token in self.postings if search(token)]
+                return {self.doc_keys[doc_id] for doc_id in self.docs_for_tokens(tokens)} if tokens else set()
+
+            terms = set(TOKEN_RE.findall(query.casefold()))
+            if not terms:
+                return set()
+            doc_sets = []
+            for term in terms:
+                tokens = self.matching_tokens(term)
+                if not tokens:
+                    return set()
+                doc_sets.append(self.docs_for_tokens(tokens))
+
+            doc_sets.sort(key=len)
+            docs = doc_sets[0]
+            for doc_set in doc_sets[1:]:
+                docs &= doc_set
+                if not docs:
+                    break
+            return {self.doc_keys[doc_id] for doc_id in docs}
+
+
+def benchmark(snippet_count=100000, queries=('docker', 'ocker', 'host', 'docker compose', 'zzz', 'port_8')):
+    # python snippet_search_index.py [snippet_count]
+    import random
+    random.seed(0)
+    words = [f'word{i}' for i in range(20000)] + ['docker', 'compose', 'kubectl', 'hostname', 'localhost', 'port_8080']
+    items = []
+    for i in range(snippet_count):
+        content = ' '.join(random.choice(words) for _ in range(60))
+        items.append((f'data/snippet_{i:08d}.json', {'content': content, '$host': f'host{i % 100}.example.com'}))
+
+    index = SnippetSearchIndex()
+    start = time.perf_counter()
+    index.build(items)
+    print(f'build {snippet_count} snippets: {time.perf_counter() - start:.2f} s, '
+          f'{len(index.postings)} tokens, {len(index.token_trigrams)} trigrams')
+
+    for query in queries:
+        start = time.perf_counter()
+        for _ in range(10):
+            result = index.search(query)
+        elapsed = (time.perf_counter() - start) / 10
+        print(f'{query!r:18s} {elapsed * 1000:7.2f} ms  {len(result)} snippets')
+
+    start = time.perf_counter()
+    index.update(items[0][0], {'content': 'changed docker body'})
+    index.remove(items[1][0])
+    print(f'update + remove: {(time.perf_counter() - start) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
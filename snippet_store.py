@@ -0,0 +1,570 @@
+import os
+import sys
+import json
+import zlib
+import lzma
+import base64
+import sqlite3
+import hashlib
+import threading
+
+from snippet_cache import SnippetCache
+
+
+METADATA_FIELDS = ('title', 'type', 'timestamp', 'folder')
+
+# 大的 content 压缩后以 base64 存在 content_z 里, title/type/timestamp 等字段保持明文
+CONTENT_CODECS = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+}
+ENCODING_FIELDS = ('content_encoding', 'content_z', 'content_size', 'content_sha1')
+DEFAULT_COMPRESS_THRESHOLD = 64 * 1024
+
+# sqlite 的 meta 表里记录已经从 data/*.json 迁移过
+MIGRATED_META = 'migrated_from_json'
+
+
+def content_hash(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def encode_snippet(snippet, threshold=DEFAULT_COMPRESS_THRESHOLD, codec='zlib'):
+    data = snippet.get('content', '').encode('utf-8')
+    if not threshold or len(data) < threshold or codec not in CONTENT_CODECS:
+        return snippet
+
+    compressed = CONTENT_CODECS[codec][0](data)
+    if len(compressed) >= len(data):
+        return snippet
+
+    encoded = {key: value for key, value in snippet.items() if key != 'content'}
+    encoded['content_encoding'] = codec
+    encoded['content_z'] = base64.b64encode(compressed).decode('ascii')
+    encoded['content_size'] = len(data)
+    encoded['content_sha1'] = hashlib.sha1(data).hexdigest()
+    return encoded
+
+
+def decode_snippet(snippet):
+    codec = snippet.get('content_encoding')
+    if codec is None:
+        return snippet
+
+    decoded = {key: value for key, value in snippet.items() if key not in ENCODING_FIELDS}
+    decoded['content'] = CONTENT_CODECS[codec][1](base64.b64decode(snippet['content_z'])).decode('utf-8')
+    return decoded
+
+
+def saved_bytes(snippet):
+    # 压缩节省的字节数, 未压缩的 snippet 返回 0
+    if snippet.get('content_encoding') is None:
+        return 0
+    return snippet['content_size'] - len(snippet['content_z'])
+
+
+def write_json_atomic(file_path, data, indent=None):
+    # 先写临时文件再 os.replace, 中途崩溃也不会留下写了一半的文件
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        # json.dumps 走 C 编码器, 比 json.dump 快很多
+        f.write(json.dumps(data, ensure_ascii=False, indent=indent))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+class JsonSnippetStore:
+    """每个 snippet 一个 json 文件 (data/snippet_*.json), key 就是文件路径"""
+
+    name = 'json'
+
+    index_file_name = '.snippets_index'
+    # index 的修改先追加到日志里, 日志太长或者关闭时才整体重写 index
+    index_log_name = '.snippets_index.log'
+
+    def __init__(self, data_dir, cache_bytes=32 * 1024 * 1024,
+                 compress_threshold=DEFAULT_COMPRESS_THRESHOLD, compress_codec='zlib', index_compact_lines=5000):
+        self.data_dir = data_dir
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+
+        self.compress_threshold = compress_threshold
+        self.compress_codec = compress_codec
+
+        self.cache = SnippetCache(cache_bytes)
+        # 后台写盘线程和 GUI 线程共用 index 和 cache
+        self.lock = threading.RLock()
+
+        # 元数据索引: key -> {title, type, timestamp, size, mtime, hash}
+        # 通过 stat() 的 size/mtime 判断是否需要重新解析文件
+        self.index_path = os.path.join(self.data_dir, self.index_file_name)
+        self.index_log_path = os.path.join(self.data_dir, self.index_log_name)
+        self.index_compact_lines = index_compact_lines
+        self.index = {}
+        self.index_changes = {}  # key -> entry (删除时为 None), 还没写进日志的修改
+        self.index_log_lines = 0
+        self.load_index()
+
+        # store 自己最后一次修改 data 目录 (增删文件, 原子替换) 之后目录的 mtime;
+        # 目录的 mtime 和它不一样说明有别人改过, 需要扫描
+        self.dir_mtime = None
+        self.dir_changed_externally = True
+
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.index = json.load(f)
+        except Exception as e:
+            print(f"Error loading {self.index_path}: {e}")
+            self.index = {}
+            return
+
+        if not os.path.exists(self.index_log_path):
+            return
+        try:
+            with open(self.index_log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        change = json.loads(line)
+                    except ValueError:
+                        # 最后一行可能没写完, index 只是缓存, 之后 scan 会按 stat 补上
+                        continue
+                    if change['entry'] is None:
+                        self.index.pop(change['key'], None)
+                    else:
+                        self.index[change['key']] = change['entry']
+                    self.index_log_lines += 1
+        except Exception as e:
+            print(f"Error loading {self.index_log_path}: {e}")
+
+    def save_index(self, compact=False):
+        # 只把修改过的条目追加到日志里; 日志太长或者 compact=True 时才整体重写 index
+        with self.lock:
+            if not self.index_changes and not (compact and self.index_log_lines):
+                return
+            try:
+                self.begin_own_change()
+                if compact or self.index_log_lines + len(self.index_changes) > self.index_compact_lines:
+                    write_json_atomic(self.index_path, self.index)
+                    if os.path.exists(self.index_log_path):
+                        os.remove(self.index_log_path)
+                    self.index_log_lines = 0
+                else:
+                    with open(self.index_log_path, 'a', encoding='utf-8') as f:
+                        f.write(''.join(json.dumps({'key': key, 'entry': entry}, ensure_ascii=False) + '\n'
+                                        for key, entry in self.index_changes.items()))
+                    self.index_log_lines += len(self.index_changes)
+                self.index_changes.clear()
+            except Exception as e:
+                print(f"Error saving {self.index_path}: {e}")
+            finally:
+                self.end_own_change()
+
+    def directory_mtime(self):
+        return os.stat(self.data_dir).st_mtime_ns
+
+    def begin_own_change(self):
+        # 在 self.lock 里调用; 上一次自己修改之后目录又被别人改过的话记下来, 不能被这次修改掩盖
+        if self.dir_mtime is not None and self.directory_mtime() != self.dir_mtime:
+            self.dir_changed_externally = True
+
+    def end_own_change(self):
+        self.dir_mtime = self.directory_mtime()
+
+    def has_external_changes(self):
+        """data 目录 (增删文件, 原子替换) 在 store 自己最后一次修改之后有没有被别人改过"""
+        with self.lock:
+            return self.dir_changed_externally or self.directory_mtime() != self.dir_mtime
+
+    def is_own_version(self, key):
+        """key 的文件是不是 store 自己最后一次写入 (或者扫描到) 的版本"""
+        try:
+            stat = os.stat(key)
+        except OSError:
+            return False
+        with self.lock:
+            return self.index_matches(key, stat)
+
+    def update_index_entry(self, key, snippet, stat=None):
+        if stat is None:
+            stat = os.stat(key)
+        entry = {field: snippet[field] for field in METADATA_FIELDS if field in snippet}
+        entry['size'] = stat.st_size
+        entry['mtime'] = stat.st_mtime_ns
+        entry['hash'] = snippet.get('content_sha1') or content_hash(snippet.get('content', ''))
+        entry['saved'] = saved_bytes(snippet)
+        self.index[key] = entry
+        self.index_changes[key] = entry
+        return entry
+
+    def remove_index_entry(self, key):
+        if self.index.pop(key, None) is not None:
+            self.index_changes[key] = None
+
+    def index_matches(self, key, stat):
+        meta = self.index.get(key)
+        return meta is not None and meta['size'] == stat.st_size and meta['mtime'] == stat.st_mtime_ns
+
+    def list_metadata(self):
+        metadata, _, _ = self.scan()
+        return metadata
+
+    def scan_changes(self):
+        _, changed, removed = self.scan()
+        return changed, removed
+
+    def scan(self):
+        """返回 (全部元数据, 新增/修改过的元数据, 已删除的 key); 可以在后台线程调用"""
+        # 目录的 mtime 在列目录之前取, 扫描期间别人的修改会让下一次 has_external_changes() 返回 True
+        with self.lock:
+            dir_mtime = self.directory_mtime()
+            self.dir_changed_externally = False
+            self.dir_mtime = dir_mtime
+
+        # 列目录和 stat 不占锁, 后台写盘和界面线程的 load() 不用等
+        stats = {}
+        for entry in os.scandir(self.data_dir):
+            if entry.name.endswith('.json'):
+                stats[os.path.join(self.data_dir, entry.name)] = entry.stat()
+
+        # 新增或者被修改过的文件才重新解析, 解析也不占锁
+        with self.lock:
+            stale = {key: self.index.get(key) for key, stat in stats.items()
+                     if not self.index_matches(key, stat)}
+        parsed = {}
+        for key in stale:
+            try:
+                with open(key, 'r', encoding='utf-8') as f:
+                    parsed[key] = json.load(f)
+            except Exception as e:
+                print(f"Error loading {key}: {e}")
+
+        metadata = []
+        changed = []
+        removed = []
+        with self.lock:
+            for key, stat in stats.items():
+                meta = self.index.get(key)
+                is_changed = key in stale and meta is stale[key]
+                if is_changed:
+                    # 解析期间自己又保存过的文件 (index 条目变了) 以 index 为准
+                    if key not in parsed:
+                        continue
+                    meta = self.update_index_entry(key, parsed[key], stat)
+                elif meta is None:
+                    continue
+
+                item = {'file_path': key, **{field: meta[field] for field in METADATA_FIELDS if field in meta}}
+                metadata.append(item)
+                if is_changed:
+                    changed.append(item)
+
+            for key in list(self.index.keys()):
+                # 列目录之后自己新写的文件不算删除
+                if key not in stats and not os.path.exists(key):
+                    self.remove_index_entry(key)
+                    self.cache.invalidate(key)
+                    removed.append(key)
+
+            if changed:
+                print(f'metadata index: {len(changed)} of {len(metadata)} snippets re-parsed')
+            self.save_index()
+            return metadata, changed, removed
+
+    def keys(self):
+        return [os.path.join(self.data_dir, filename)
+                for filename in os.listdir(self.data_dir)
+                if filename.endswith('.json')]
+
+    def list_snippets(self):
+        snippets = []
+        for file_path in self.keys():
+            try:
+                snippet = self.load(file_path)
+                snippet['file_path'] = file_path
+                snippets.append(snippet)
+            except Exception as e:
+                print(f"Error loading {file_path}: {e}")
+        return snippets
+
+    def iter_snippets(self):
+        """逐个读取所有 snippet, 不经过缓存 (给后台建全文索引用, 不把缓存里常用的 snippet 挤出去)"""
+        for key in self.keys():
+            try:
+                with open(key, 'r', encoding='utf-8') as f:
+                    yield key, decode_snippet(json.load(f))
+            except Exception as e:
+                print(f"Error loading {key}: {e}")
+
+    def load(self, key):
+        # 命中缓存时只需要一次 stat(), 不打开文件
+        stat = os.stat(key)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            snippet = self.cache.get(key, version)
+        if snippet is not None:
+            return snippet
+
+        with open(key, 'r', encoding='utf-8') as f:
+            snippet = decode_snippet(json.load(f))
+        with self.lock:
+            self.cache.put(key, version, snippet, max(stat.st_size, len(snippet.get('content', ''))))
+        return snippet
+
+    def save(self, key, snippet):
+        encoded = encode_snippet(snippet, self.compress_threshold, self.compress_codec)
+        # 写文件和更新 index 放在一把锁里, 避免 scan() 把自己写的文件当成外部修改
+        with self.lock:
+            self.begin_own_change()
+            try:
+                write_json_atomic(key, encoded, indent=4)
+            finally:
+                self.end_own_change()
+            stat = os.stat(key)
+            self.cache.put(key, (stat.st_mtime_ns, stat.st_size), snippet,
+                           max(stat.st_size, len(snippet.get('content', ''))))
+            self.update_index_entry(key, encoded, stat)
+
+    def add(self, snippet, now):
+        file_name_ts = now.strftime("%Y%m%d%H%M%S%f")
+        key = os.path.join(self.data_dir, f"snippet_{file_name_ts}.json")
+        self.save(key, snippet)
+        return key
+
+    def add_many(self, snippets, now, start=0):
+        # 批量导入: 每个 snippet 只写一次新文件 (不需要 replace/fsync), index 在下次 scan/close 时保存
+        file_name_ts = now.strftime("%Y%m%d%H%M%S%f")
+        keys = []
+        with self.lock:
+            self.begin_own_change()
+            try:
+                for number, snippet in enumerate(snippets, start):
+                    key = os.path.join(self.data_dir, f"snippet_{file_name_ts}_{number:06d}.json")
+                    encoded = encode_snippet(snippet, self.compress_threshold, self.compress_codec)
+                    with open(key, 'w', encoding='utf-8') as f:
+                        f.write(json.dumps(encoded, ensure_ascii=False, indent=4))
+                    self.update_index_entry(key, encoded)
+                    keys.append(key)
+            finally:
+                self.end_own_change()
+        return keys
+
+    def delete(self, key):
+        with self.lock:
+            self.begin_own_change()
+            try:
+                os.remove(key)
+            finally:
+                self.end_own_change()
+            self.cache.invalidate(key)
+            self.remove_index_entry(key)
+
+    def compression_stats(self):
+        self.scan()
+        with self.lock:
+            entries = list(self.index.values())
+        return {
+            'snippets': len(entries),
+            'compressed': sum(1 for entry in entries if entry.get('saved', 0) > 0),
+            'stored_bytes': sum(entry['size'] for entry in entries),
+            'saved_bytes': sum(entry.get('saved', 0) for entry in entries),
+        }
+
+    def close(self):
+        self.save_index(compact=True)
+
+
+class SqliteSnippetStore:
+    """所有 snippet 存在一个 sqlite 文件里, title/type/timestamp/folder 单独成列方便只读元数据"""
+
+    name = 'sqlite'
+
+    def __init__(self, db_path, compress_threshold=DEFAULT_COMPRESS_THRESHOLD, compress_codec='zlib'):
+        self.db_path = db_path
+        self.compress_threshold = compress_threshold
+        self.compress_codec = compress_codec
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        # 连接会被后台写盘线程使用, 用锁串行化访问
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS snippets (
+                key TEXT PRIMARY KEY,
+                type TEXT,
+                title TEXT,
+                timestamp TEXT,
+                data TEXT NOT NULL,
+                folder TEXT NOT NULL DEFAULT ''
+            )''')
+        # 旧版本建的表没有 folder 列
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(snippets)')]
+        if 'folder' not in columns:
+            self.conn.execute("ALTER TABLE snippets ADD COLUMN folder TEXT NOT NULL DEFAULT ''")
+        # 存储自身的状态, 例如是否已经从 json 迁移过
+        self.conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self.conn.commit()
+
+    def get_meta(self, name, default=None):
+        with self.lock:
+            row = self.conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_meta(self, name, value):
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+
+    def keys(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute('SELECT key FROM snippets')]
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM snippets').fetchone()[0]
+
+    def list_snippets(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT key, data FROM snippets').fetchall()
+        snippets = []
+        for key, data in rows:
+            try:
+                snippet = decode_snippet(json.loads(data))
+                snippet['file_path'] = key
+                snippets.append(snippet)
+            except Exception as e:
+                print(f"Error loading {key}: {e}")
+        return snippets
+
+    def iter_snippets(self, batch_size=500):
+        # 按 key 分页读取, 每页之间释放锁, 不长时间占住连接
+        last_key = ''
+        while True:
+            with self.lock:
+                rows = self.conn.execute('SELECT key, data FROM snippets WHERE key > ? ORDER BY key LIMIT ?',
+                                         (last_key, batch_size)).fetchall()
+            if not rows:
+                return
+            for key, data in rows:
+                try:
+                    yield key, decode_snippet(json.loads(data))
+                except Exception as e:
+                    print(f"Error loading {key}: {e}")
+            last_key = rows[-1][0]
+
+    def list_metadata(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT key, title, type, timestamp, folder FROM snippets').fetchall()
+        return [{'file_path': key, 'title': title, 'type': snippet_type, 'timestamp': timestamp, 'folder': folder}
+                for key, title, snippet_type, timestamp, folder in rows]
+
+    def load(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT data FROM snippets WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return decode_snippet(json.loads(row[0]))
+
+    def save(self, key, snippet):
+        self.save_many([(key, snippet)])
+
+    def save_many(self, items):
+        rows = [(key, snippet.get('type', ''), snippet.get('title', ''), snippet.get('timestamp', ''),
+                 snippet.get('folder', ''),
+                 json.dumps(encode_snippet(snippet, self.compress_threshold, self.compress_codec),
+                            ensure_ascii=False))
+                for key, snippet in items]
+        with self.lock, self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO snippets (key, type, title, timestamp, folder, data) '
+                                  'VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def add(self, snippet, now):
+        key = f"snippet_{now.strftime('%Y%m%d%H%M%S%f')}"
+        self.save(key, snippet)
+        return key
+
+    def add_many(self, snippets, now, start=0):
+        file_name_ts = now.strftime('%Y%m%d%H%M%S%f')
+        keys = [f"snippet_{file_name_ts}_{number:06d}" for number in range(start, start + len(snippets))]
+        self.save_many(zip(keys, snippets))
+        return keys
+
+    def delete(self, key):
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM snippets WHERE key = ?', (key,))
+
+    def compression_stats(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT data FROM snippets').fetchall()
+        stats = {'snippets': len(rows), 'compressed': 0, 'stored_bytes': 0, 'saved_bytes': 0}
+        for data, in rows:
+            saved = saved_bytes(json.loads(data))
+            stats['stored_bytes'] += len(data.encode('utf-8'))
+            stats['saved_bytes'] += saved
+            stats['compressed'] += saved > 0
+        return stats
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def create_store(backend, data_dir, cache_bytes=32 * 1024 * 1024,
+                 compress_threshold=DEFAULT_COMPRESS_THRESHOLD, compress_codec='zlib'):
+    if backend == SqliteSnippetStore.name:
+        store = SqliteSnippetStore(os.path.join(data_dir, 'snippets.db'), compress_threshold, compress_codec)
+        # 第一次切换到 sqlite 时自动从 data/*.json 迁移; 迁移过就记下来, 之后删光了 snippet 也不再导入
+        if store.get_meta(MIGRATED_META) is None:
+            if store.count() == 0:
+                migrate_json_to_sqlite(data_dir, store)
+            else:
+                store.set_meta(MIGRATED_META, '1')
+        return store
+    return JsonSnippetStore(data_dir, cache_bytes, compress_threshold, compress_codec)
+
+
+def migrate_json_to_sqlite(data_dir, store):
+    json_store = JsonSnippetStore(data_dir)
+    items = []
+    for snippet in json_store.list_snippets():
+        file_path = snippet.pop('file_path')
+        key = os.path.splitext(os.path.basename(file_path))[0]
+        items.append((key, snippet))
+
+    store.save_many(items)
+    store.set_meta(MIGRATED_META, str(len(items)))
+    print(f'migrated {len(items)} snippets from {data_dir} to {store.db_path}')
+    return len(items)
+
+
+def print_compression_stats(store):
+    stats = store.compression_stats()
+    stored = stats['stored_bytes']
+    saved = stats['saved_bytes']
+    ratio = saved / (stored + saved) if stored + saved else 0.0
+    print(f"{stats['compressed']} of {stats['snippets']} snippets compressed, "
+          f"{stored} bytes stored, {saved} bytes saved ({ratio:.1%})")
+
+
+if __name__ == '__main__':
+    # python snippet_store.py migrate [data_dir]
+    # python snippet_store.py stats [data_dir] [json|sqlite]
+    if len(sys.argv) >= 2 and sys.argv[1] == 'migrate':
+        data_dir = sys.argv[2] if len(sys.argv) >= 3 else 'data'
+        sqlite_store = SqliteSnippetStore(os.path.join(data_dir, 'snippets.db'))
+        migrate_json_to_sqlite(data_dir, sqlite_store)
+        sqlite_store.close()
+    elif len(sys.argv) >= 2 and sys.argv[1] == 'stats':
+        data_dir = sys.argv[2] if len(sys.argv) >= 3 else 'data'
+        backend = sys.argv[3] if len(sys.argv) >= 4 else JsonSnippetStore.name
+        store = create_store(backend, data_dir)
+        print_compression_stats(store)
+        store.close()
+    else:
+        print('usage: python snippet_store.py migrate [data_dir]')
+        print('       python snippet_store.py stats [data_dir] [json|sqlite]')
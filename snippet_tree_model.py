@@ -0,0 +1,609 @@
+import os
+import sys
+import time
+import datetime
+
+from PyQt5.QtCore import Qt, QAbstractItemModel, QModelIndex, pyqtSignal
+
+
+COLUMN_TITLE = 0
+COLUMN_TYPE = 1
+COLUMN_FILE = 2
+COLUMN_TIMESTAMP = 3
+# rows 里可选的第 5 项: snippet 所在的文件夹 ('a/b'), 空字符串表示顶层
+ROW_FOLDER = 4
+FOLDER_SEPARATOR = '/'
+# 排序用的 key: 每行加载或修改时算一次 (title casefold, type 序号, file_path, timestamp 毫秒数)
+SORT_ROLE = Qt.UserRole + 1
+# 不显示的排序 key: 使用频率 (frecency 分数, 相同时按修改时间)
+SORT_USAGE = 4
+TYPE_ORDER = ['Plain text', 'Python', 'C++', 'Markdown']
+EPOCH = datetime.datetime(1970, 1, 1)
+ONE_MILLISECOND = datetime.timedelta(milliseconds=1)
+
+
+def normalize_folder(path):
+    """' a//b / ' -> 'a/b'"""
+    return FOLDER_SEPARATOR.join(name.strip() for name in (path or '').split(FOLDER_SEPARATOR) if name.strip())
+
+
+def timestamp_key(timestamp):
+    """'2025-01-01 12:00:00.000' -> 毫秒数 (本地时间按 UTC 算, 只用来比较); 解析不了的排在最前面"""
+    try:
+        return (datetime.datetime.fromisoformat(timestamp) - EPOCH) // ONE_MILLISECOND
+    except (TypeError, ValueError):
+        return 0
+
+
+class SnippetFolder:
+    """文件夹节点: 子节点是 folders 在前, snippet (leaf 行号) 在后; fetched 之前视图看不到任何子节点"""
+
+    __slots__ = ('name', 'path', 'parent', 'position', 'folders', 'folders_by_name', 'rows', 'free_rows',
+                 'live_count', 'fetched')
+
+    def __init__(self, name='', path='', parent=None, position=0):
+        self.name = name
+        self.path = path
+        self.parent = parent
+        self.position = position  # 在 parent.folders 里的下标
+        self.folders = []
+        self.folders_by_name = {}
+        self.rows = []
+        self.free_rows = []  # 这个文件夹里已删除的 leaf 行号, 之后添加到这里的 snippet 优先复用
+        self.live_count = 0  # 子树里没删除的 snippet 数量, 为 0 的文件夹不显示
+        self.fetched = parent is None  # 顶层总是已经展开
+
+    def child_count(self):
+        return len(self.folders) + len(self.rows)
+
+
+class SnippetTreeModel(QAbstractItemModel):
+    """按列存储的 snippet 模型, snippet 按 folder 挂在文件夹节点下
+
+    每一列是一个 list, 一个 snippet 就是四个 list 里同一个下标 (leaf 行号) 的字符串, rows_by_path 维护
+    file_path -> leaf 行号. 删除时不移动其它行 (否则所有行号都要重算), 只把这一行清空成空位
+    (flags 为 NoItemFlags, proxy 会把它过滤掉), 之后添加到同一个文件夹的 snippet 优先填空位.
+    这样查找/修改/删除都是 O(1), 行号也不受 proxy 排序影响 (排序只改变 proxy 的映射).
+
+    排序在这里完成 (sort): 每个文件夹的 rows 按 sort_keys 用 list.sort 重排, 一次 layoutChanged,
+    proxy 自己不排序, 避免每次比较都回调 Python. 之后修改/添加的行用二分查找放到排好序的位置.
+    文件夹总是按名字排在 snippet 前面.
+
+    文件夹的子节点在第一次展开时才通过 canFetchMore/fetchMore 交给视图, 折叠的文件夹不产生任何 index.
+    proxy 通过 leaf_row/folder_at/leaf_texts/leaf_folders 直接读这里的数据, 过滤时不需要展开文件夹;
+    snippets_changed 先于 Qt 自己的信号发出, 包括还没展开的文件夹里的行.
+    """
+
+    headers = ['Title', 'Type', 'File', 'Timestamp']
+
+    # 受影响的 leaf 行号 list, 是否有新增的 snippet
+    snippets_changed = pyqtSignal(object, bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.columns = [[] for _ in self.headers]
+        self.sort_keys = [[] for _ in range(SORT_USAGE + 1)]
+        self.usage_scores = {}  # file_path -> frecency 分数 (SnippetUsage.scores)
+        self.type_ordinals = {snippet_type: ordinal for ordinal, snippet_type in enumerate(TYPE_ORDER)}
+        self.sort_column = -1  # -1 表示保持添加的顺序
+        self.sort_order = Qt.AscendingOrder
+        self.row_folders = []  # leaf 行号 -> SnippetFolder
+        self.row_positions = []  # leaf 行号 -> 在 SnippetFolder.rows 里的下标
+        self.rows_by_path = {}
+        self.root = SnippetFolder()
+
+    def folder_for(self, index):
+        # index 这一行是文件夹时返回它, 是 snippet 时返回 None; 无效 index 是顶层
+        if not index.isValid():
+            return self.root
+        parent_folder = index.internalPointer()
+        row = index.row()
+        return parent_folder.folders[row] if row < len(parent_folder.folders) else None
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not (0 <= column < len(self.headers)) or parent.column() > 0:
+            return QModelIndex()
+        folder = self.folder_for(parent)
+        if folder is None or not folder.fetched or not (0 <= row < folder.child_count()):
+            return QModelIndex()
+        # internalPointer 是所在的文件夹
+        return self.createIndex(row, column, folder)
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.folder_index(index.internalPointer())
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        folder = self.folder_for(parent)
+        return folder.child_count() if folder is not None and folder.fetched else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.headers)
+
+    def hasChildren(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return False
+        folder = self.folder_for(parent)
+        return folder is not None and folder.child_count() > 0
+
+    def canFetchMore(self, parent):
+        if parent.column() > 0:
+            return False
+        folder = self.folder_for(parent)
+        return folder is not None and not folder.fetched and folder.child_count() > 0
+
+    def fetchMore(self, parent):
+        folder = self.folder_for(parent)
+        if folder is None or folder.fetched:
+            return
+        count = folder.child_count()
+        if count:
+            self.beginInsertRows(parent, 0, count - 1)
+        folder.fetched = True
+        if count:
+            self.endInsertRows()
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        leaf = self.leaf_row(index.row(), index.parent())
+        if leaf >= 0 and self.is_row_removed(leaf):
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole and role != Qt.ToolTipRole and role != SORT_ROLE:
+            return None
+        folder = index.internalPointer()
+        row = index.row()
+        if row < len(folder.folders):
+            child = folder.folders[row]
+            if role == SORT_ROLE:
+                return child.name.casefold()
+            if index.column() != COLUMN_TITLE:
+                return None
+            return child.name if role == Qt.DisplayRole else child.path
+        columns = self.sort_keys if role == SORT_ROLE else self.columns
+        return columns[index.column()][folder.rows[row - len(folder.folders)]]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def folder_index(self, folder):
+        # 只有在 parent 已经展开时才有效
+        if folder.parent is None:
+            return QModelIndex()
+        return self.createIndex(folder.position, 0, folder.parent)
+
+    def leaf_index(self, row, column=0):
+        folder = self.row_folders[row]
+        return self.createIndex(len(folder.folders) + self.row_positions[row], column, folder)
+
+    def get_folder(self, path, notify=True):
+        """path 对应的文件夹, 不存在时逐级创建"""
+        folder = self.root
+        path = normalize_folder(path)
+        for name in path.split(FOLDER_SEPARATOR) if path else ():
+            child = folder.folders_by_name.get(name)
+            if child is None:
+                # 按名字插到子文件夹里 (都在 snippet 之前)
+                folded = name.casefold()
+                position = len(folder.folders)
+                while position > 0 and folder.folders[position - 1].name.casefold() > folded:
+                    position -= 1
+                child_path = f'{folder.path}{FOLDER_SEPARATOR}{name}' if folder.path else name
+                child = SnippetFolder(name, child_path, folder, position)
+                if notify and folder.fetched:
+                    self.beginInsertRows(self.folder_index(folder), position, position)
+                folder.folders.insert(position, child)
+                for sibling in folder.folders[position + 1:]:
+                    sibling.position += 1
+                folder.folders_by_name[name] = child
+                if notify and folder.fetched:
+                    self.endInsertRows()
+            folder = child
+        return folder
+
+    def add_live_count(self, folder, delta):
+        while folder is not None:
+            folder.live_count += delta
+            folder = folder.parent
+
+    def emit_folders_changed(self, folders):
+        # 子树里的 snippet 有增减, 让 proxy 重新判断这些文件夹 (以及上层文件夹) 是否显示
+        changed = set()
+        for folder in folders:
+            while folder.parent is not None and folder not in changed:
+                changed.add(folder)
+                if folder.parent.fetched:
+                    index = self.folder_index(folder)
+                    self.dataChanged.emit(index, index.sibling(index.row(), len(self.headers) - 1))
+                folder = folder.parent
+
+    def emit_row_changed(self, row):
+        if self.row_folders[row].fetched:
+            self.dataChanged.emit(self.leaf_index(row), self.leaf_index(row, len(self.headers) - 1))
+
+    def make_sort_keys(self, values):
+        title, snippet_type, file_path, timestamp = values[:ROW_FOLDER]
+        ordinal = self.type_ordinals.setdefault(snippet_type, len(self.type_ordinals))
+        timestamp = timestamp_key(timestamp)
+        return (title or '').casefold(), ordinal, file_path, timestamp, (self.usage_scores.get(file_path, 0.0), timestamp)
+
+    def set_sort_keys(self, row, keys):
+        for column, key in zip(self.sort_keys, keys):
+            column[row] = key
+
+    def iter_folders(self):
+        stack = [self.root]
+        while stack:
+            folder = stack.pop()
+            yield folder
+            stack.extend(folder.folders)
+
+    def sort_folder_rows(self, folder):
+        keys = self.sort_keys[self.sort_column]
+        folder.rows.sort(key=keys.__getitem__, reverse=self.sort_order == Qt.DescendingOrder)
+        for position, row in enumerate(folder.rows):
+            self.row_positions[row] = position
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """按 column 的 sort_keys 重排每个文件夹 (包括还没展开的), column < 0 时之后的行不再排序"""
+        self.sort_column = column
+        self.sort_order = order
+        if column < 0 or column >= len(self.sort_keys):
+            self.sort_column = -1
+            return
+        self.sort_folders(list(self.iter_folders()))
+
+    def sort_folders(self, folders):
+        # 一次 layoutChanged; 视图的选中行等 persistent index 跟着行走
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        # 文件夹的位置不变, 只有 snippet 行需要换成新位置
+        leaves = [self.leaf_row(index.row(), index.parent()) for index in persistent]
+        for folder in folders:
+            self.sort_folder_rows(folder)
+        self.changePersistentIndexList(persistent, [
+            index if leaf < 0 else self.leaf_index(leaf, index.column()) for index, leaf in zip(persistent, leaves)])
+        self.layoutChanged.emit()
+
+    def sorted_position(self, folder, row, rows=None):
+        """row 在 folder 里按当前排序应该插入的位置 (rows 不包括 row 自己), 相同的 key 排在后面"""
+        rows = folder.rows if rows is None else rows
+        keys = self.sort_keys[self.sort_column]
+        key = keys[row]
+        low, high = 0, len(rows)
+        descending = self.sort_order == Qt.DescendingOrder
+        while low < high:
+            middle = (low + high) // 2
+            if (key > keys[rows[middle]]) if descending else (key < keys[rows[middle]]):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def reposition_row(self, row):
+        """修改后的行不在排好序的位置时移过去"""
+        if self.sort_column < 0:
+            return
+        folder = self.row_folders[row]
+        old = self.row_positions[row]
+        rows = folder.rows[:old] + folder.rows[old + 1:]
+        new = self.sorted_position(folder, row, rows)
+        if new == old:
+            return
+        first_folder_row = len(folder.folders)
+        if folder.fetched:
+            parent = self.folder_index(folder)
+            # 往下移时目标位置按移动前的行号算
+            destination = first_folder_row + (new + 1 if new > old else new)
+            self.beginMoveRows(parent, first_folder_row + old, first_folder_row + old, parent, destination)
+        rows.insert(new, row)
+        folder.rows = rows
+        for position in range(min(old, new), max(old, new) + 1):
+            self.row_positions[rows[position]] = position
+        if folder.fetched:
+            self.endMoveRows()
+
+    def set_rows(self, rows):
+        """rows: [(title, type, file_path, timestamp[, folder]), ...], 只 reset 一次"""
+        self.beginResetModel()
+        self.columns = [[] for _ in self.headers]
+        self.sort_keys = [list(column) for column in zip(*map(self.make_sort_keys, rows))] if rows else \
+            [[] for _ in range(SORT_USAGE + 1)]
+        self.row_folders = []
+        self.row_positions = []
+        self.rows_by_path = {}
+        self.root = SnippetFolder()
+        folders = {}
+        for row, values in enumerate(rows):
+            path = values[ROW_FOLDER] if len(values) > ROW_FOLDER else ''
+            folder = folders.get(path)
+            if folder is None:
+                folder = folders[path] = self.get_folder(path, notify=False)
+            for column, value in zip(self.columns, values):
+                column.append(value)
+            self.row_folders.append(folder)
+            self.row_positions.append(len(folder.rows))
+            folder.rows.append(row)
+            self.rows_by_path[values[COLUMN_FILE]] = row
+        for folder in folders.values():
+            self.add_live_count(folder, len(folder.rows))
+            if self.sort_column >= 0:
+                self.sort_folder_rows(folder)
+        self.endResetModel()
+
+    def append_rows(self, rows):
+        """返回每个新行的 leaf 行号; 所在文件夹还没展开时视图看不到新行, 只发 snippets_changed"""
+        row_numbers = []
+        reused = []
+        appended = {}  # 文件夹 -> 新 leaf 行号, 每个文件夹只插入一次
+        for values in rows:
+            folder = self.get_folder(values[ROW_FOLDER] if len(values) > ROW_FOLDER else '')
+            keys = self.make_sort_keys(values)
+            if folder.free_rows:
+                # 先填删除留下的空位
+                row = folder.free_rows.pop()
+                for column, value in zip(self.columns, values):
+                    column[row] = value
+                self.set_sort_keys(row, keys)
+                reused.append(row)
+            else:
+                row = len(self.columns[0])
+                for column, value in zip(self.columns, values):
+                    column.append(value)
+                for column, key in zip(self.sort_keys, keys):
+                    column.append(key)
+                self.row_folders.append(folder)
+                self.row_positions.append(-1)
+                appended.setdefault(folder, []).append(row)
+            self.rows_by_path[values[COLUMN_FILE]] = row
+            self.add_live_count(folder, 1)
+            row_numbers.append(row)
+        if not row_numbers:
+            return row_numbers
+
+        self.snippets_changed.emit(row_numbers, True)
+        for row in reused:
+            self.reposition_row(row)
+            self.emit_row_changed(row)
+        for folder, new_rows in appended.items():
+            if self.sort_column >= 0 and len(new_rows) == 1:
+                # 单独一行直接插到排好序的位置
+                self.insert_rows(folder, new_rows, self.sorted_position(folder, new_rows[0]))
+                continue
+            self.insert_rows(folder, new_rows, len(folder.rows))
+            if self.sort_column >= 0:
+                # 整批插到最后, 再把这个文件夹重排一次
+                if folder.fetched:
+                    self.sort_folders([folder])
+                else:
+                    self.sort_folder_rows(folder)
+        self.emit_folders_changed({self.row_folders[row] for row in row_numbers})
+        return row_numbers
+
+    def insert_rows(self, folder, rows, position):
+        first = len(folder.folders) + position
+        if folder.fetched:
+            self.beginInsertRows(self.folder_index(folder), first, first + len(rows) - 1)
+        folder.rows[position:position] = rows
+        for index in range(position, len(folder.rows)):
+            self.row_positions[folder.rows[index]] = index
+        if folder.fetched:
+            self.endInsertRows()
+
+    def update_row(self, row, title, snippet_type, timestamp):
+        self.columns[COLUMN_TITLE][row] = title
+        self.columns[COLUMN_TYPE][row] = snippet_type
+        self.columns[COLUMN_TIMESTAMP][row] = timestamp
+        self.set_sort_keys(row, self.make_sort_keys((title, snippet_type, self.columns[COLUMN_FILE][row], timestamp)))
+        self.snippets_changed.emit([row], False)
+        self.reposition_row(row)
+        self.emit_row_changed(row)
+
+    def update_usage(self, file_path):
+        """usage_scores 里 file_path 的分数变了, 按使用频率排序时把这一行移到新位置"""
+        row = self.find_row(file_path)
+        if row < 0:
+            return
+        self.sort_keys[SORT_USAGE][row] = (self.usage_scores.get(file_path, 0.0), self.sort_keys[COLUMN_TIMESTAMP][row])
+        if self.sort_column == SORT_USAGE:
+            self.reposition_row(row)
+
+    def remove_row(self, row):
+        if self.is_row_removed(row):
+            return
+        folder = self.row_folders[row]
+        self.rows_by_path.pop(self.columns[COLUMN_FILE][row], None)
+        for column in self.columns:
+            column[row] = None
+        folder.free_rows.append(row)
+        self.add_live_count(folder, -1)
+        self.snippets_changed.emit([row], False)
+        self.emit_row_changed(row)
+        self.emit_folders_changed([folder])
+
+    def is_row_removed(self, row):
+        return self.columns[COLUMN_FILE][row] is None
+
+    def find_row(self, file_path):
+        return self.rows_by_path.get(file_path, -1)
+
+    def snippet_count(self):
+        return len(self.rows_by_path)
+
+    def file_paths(self):
+        return self.rows_by_path.keys()
+
+    def iter_rows(self):
+        """跳过已删除空位的 (title, type, file_path, timestamp)"""
+        for values in zip(*self.columns):
+            if values[COLUMN_FILE] is not None:
+                yield values
+
+    def row_values(self, row):
+        return tuple(column[row] for column in self.columns)
+
+    def file_path(self, row):
+        return self.columns[COLUMN_FILE][row]
+
+    def folder_path(self, row):
+        return self.row_folders[row].path
+
+    def index_for_row(self, row, column=0):
+        """leaf 行的 index, 先依次展开它所在的文件夹"""
+        chain = []
+        folder = self.row_folders[row]
+        while folder is not None:
+            chain.append(folder)
+            folder = folder.parent
+        for folder in reversed(chain):
+            if not folder.fetched:
+                self.fetchMore(self.folder_index(folder))
+        return self.leaf_index(row, column)
+
+    # 下面是给 proxy 用的, 不需要 index, 折叠的文件夹里的行也能读到
+    def leaf_count(self):
+        return len(self.columns[0])
+
+    def leaf_row(self, row, parent=QModelIndex()):
+        """parent 下第 row 个子节点的 leaf 行号, 是文件夹时返回 -1"""
+        folder = self.folder_for(parent)
+        if folder is None or row < len(folder.folders):
+            return -1
+        return folder.rows[row - len(folder.folders)]
+
+    def folder_at(self, row, parent=QModelIndex()):
+        return self.folder_for(parent).folders[row]
+
+    def leaf_texts(self, row):
+        """参与过滤的文本 (各列, 下标和列号一致, 最后是文件夹路径); 已删除时返回 None"""
+        if self.is_row_removed(row):
+            return None
+        return [column[row] or '' for column in self.columns] + [self.row_folders[row].path]
+
+    def leaf_folders(self, row):
+        """从所在文件夹到最上层的文件夹, 不包括顶层"""
+        folders = []
+        folder = self.row_folders[row]
+        while folder.parent is not None:
+            folders.append(folder)
+            folder = folder.parent
+        return folders
+
+
+def current_rss():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def benchmark(row_count=100000):
+    # python snippet_tree_model.py [row_count]
+    from PyQt5.QtWidgets import QApplication, QTreeView
+    from PyQt5.QtGui import QStandardItemModel, QStandardItem
+    from tree_view_proxy import RecursiveFilterProxyModel
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    rows = [(f'Snippet title {i}', 'Python', f'data/snippet_{i:08d}.json', f'2025-01-01 00:00:{i % 60:02d}.000')
+            for i in range(row_count)]
+
+    def run(name, fill):
+        view = QTreeView()
+        proxy = RecursiveFilterProxyModel()
+        rss_before = current_rss()
+        start = time.perf_counter()
+        model = fill(proxy)
+        view.setModel(proxy)
+        elapsed = time.perf_counter() - start
+        rss_after = current_rss()
+        rss = f'+{(rss_after - rss_before) / 1024 / 1024:.1f} MB' if rss_before is not None else 'n/a'
+        print(f'{name:20s} {row_count} rows: load {elapsed:.3f} s, rss {rss}')
+        return model, proxy, view
+
+    def fill_standard(proxy):
+        model = QStandardItemModel()
+        model.setHorizontalHeaderLabels(SnippetTreeModel.headers)
+        proxy.setSourceModel(model)
+        for title, snippet_type, file_path, timestamp in rows:
+            model.appendRow([QStandardItem(title), QStandardItem(snippet_type),
+                             QStandardItem(file_path), QStandardItem(timestamp)])
+        return model
+
+    def fill_columnar_rows(proxy, rows):
+        model = SnippetTreeModel()
+        proxy.setSourceModel(model)
+        model.set_rows(rows)
+        return model
+
+    def fill_columnar(proxy):
+        return fill_columnar_rows(proxy, rows)
+
+    results = [run('SnippetTreeModel', fill_columnar), run('QStandardItemModel', fill_standard)]
+
+    # 自动保存 (change_item) 和删除 (del_item) 的单次耗时, 按文件路径查行
+    model = results[0][0]
+    paths = [rows[i][COLUMN_FILE] for i in range(0, row_count, max(1, row_count // 1000))]
+    start = time.perf_counter()
+    for file_path in paths:
+        model.update_row(model.find_row(file_path), 'changed', 'Python', '2025-01-02 00:00:00.000')
+    elapsed = time.perf_counter() - start
+    print(f'change_item x{len(paths)}: {elapsed / len(paths) * 1e6:.1f} us each')
+    start = time.perf_counter()
+    for file_path in paths:
+        model.remove_row(model.find_row(file_path))
+    elapsed = time.perf_counter() - start
+    print(f'del_item    x{len(paths)}: {elapsed / len(paths) * 1e6:.1f} us each')
+
+    # 点表头排序: 原来 proxy 每次比较都要通过 data() 取两行的文字, 现在 model 用算好的 key 排一次
+    from PyQt5.QtCore import QSortFilterProxyModel
+    sort_rows = [(f'Snippet title {(i * 7919) % row_count}', ('Python', 'C++', 'Markdown')[i % 3],
+                  f'data/snippet_{i:08d}.json', f'2025-{1 + i % 12:02d}-01 00:00:{i % 60:02d}.000')
+                 for i in range(row_count)]
+    for column in (0, 3):
+        old_model = SnippetTreeModel()
+        old_model.set_rows(sort_rows)
+        old_proxy = QSortFilterProxyModel()
+        old_proxy.setSourceModel(old_model)
+        start = time.perf_counter()
+        old_proxy.sort(column, Qt.DescendingOrder)
+        old_proxy.rowCount()
+        old_elapsed = time.perf_counter() - start
+
+        model, proxy, view = run('sort', lambda proxy: fill_columnar_rows(proxy, sort_rows))
+        proxy.set_key_column(COLUMN_FILE)
+        start = time.perf_counter()
+        proxy.sort(column, Qt.DescendingOrder)
+        proxy.rowCount()
+        elapsed = time.perf_counter() - start
+        print(f'sort column {column}: proxy data() {old_elapsed:.3f} s, precomputed keys {elapsed:.3f} s')
+
+    # 同样的行放进 100 x 10 个文件夹: 视图只拿到顶层, 过滤时也不展开任何文件夹
+    folder_rows = [values + (f'group{i % 100}/sub{i % 10}',) for i, values in enumerate(rows)]
+    model, proxy, view = run('folders', lambda proxy: fill_columnar_rows(proxy, folder_rows))
+    proxy.set_key_column(COLUMN_FILE)
+    start = time.perf_counter()
+    proxy.set_filter_text('title 4212')
+    visible = proxy.rowCount()
+    elapsed = time.perf_counter() - start
+    fetched = sum(sub.fetched for folder in model.root.folders for sub in folder.folders)
+    print(f'folders: filter {elapsed * 1000:.1f} ms, {visible} top-level folders shown, {fetched} of 1000 folders fetched')
+    results.append((model, proxy, view))
+    return results
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import time
+import threading
+
+
+# 每种使用的分数: 复制渲染后的预览说明这个 snippet 真的被用上了
+USAGE_WEIGHTS = {'select': 1.0, 'copy': 3.0}
+# 分数的半衰期
+DEFAULT_HALF_LIFE_DAYS = 14
+# 相对基准时间的指数超过这个值时换一个基准时间, 避免浮点溢出 (半衰期 14 天时大约 20 年一次)
+MAX_EXPONENT = 512
+
+
+class SnippetUsage:
+    """snippet 的使用记录 (选中, 复制预览): 只追加的日志 usage.log (每行一个 json), 聚合成随时间衰减的 frecency 分数
+
+    某一时刻的分数是 sum(weight * 2 ** ((time - now) / half_life)). 缓存的 scores 都相对同一个基准时间 anchor,
+    存的是 sum(weight * 2 ** ((time - anchor) / half_life)): 时间流逝只会让所有分数按同一个比例变小, 排序不变,
+    所以缓存不需要随时间刷新, 记录一次使用也只改这一个 snippet 的分数, 排序和搜索都不用重新扫描日志.
+    日志超过 compact_lines 行时改写成每个 snippet 一行的汇总 ('score' 记录).
+    """
+
+    def __init__(self, log_path, half_life_days=DEFAULT_HALF_LIFE_DAYS, compact_lines=10000):
+        self.log_path = log_path
+        self.half_life = half_life_days * 24 * 3600.0
+        self.compact_lines = compact_lines
+        self.lock = threading.RLock()
+        self.anchor = time.time()
+        self.scores = {}  # key -> 相对 anchor 的分数
+        self.log_lines = 0
+        self.load()
+
+    def weight_at(self, weight, timestamp):
+        return weight * 2.0 ** ((timestamp - self.anchor) / self.half_life)
+
+    def load(self):
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                self.log_lines += 1
+                try:
+                    record = json.loads(line)
+                    key = record['key']
+                    if record['kind'] == 'delete':
+                        self.scores.pop(key, None)
+                        continue
+                    weight = record['weight'] if record['kind'] == 'score' else USAGE_WEIGHTS[record['kind']]
+                    self.scores[key] = self.scores.get(key, 0.0) + self.weight_at(weight, record['time'])
+                except (ValueError, KeyError, TypeError, OverflowError):
+                    # 最后一行写了一半 (崩溃) 或者不认识的记录, 忽略
+                    pass
+
+    def append(self, record):
+        try:
+            with open(self.log_path, 'ab') as f:
+                f.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.log_lines += 1
+        except OSError as e:
+            print(f"Error writing usage log: {e}")
+            return
+        if self.log_lines > self.compact_lines and self.log_lines > 2 * len(self.scores):
+            self.compact()
+
+    def record(self, key, kind='select'):
+        """记一次使用, 返回 key 新的缓存分数"""
+        now = time.time()
+        with self.lock:
+            if (now - self.anchor) / self.half_life > MAX_EXPONENT:
+                self.rebase(now)
+            score = self.scores.get(key, 0.0) + self.weight_at(USAGE_WEIGHTS[kind], now)
+            self.scores[key] = score
+            self.append({'key': key, 'kind': kind, 'time': round(now, 3)})
+            return score
+
+    def rebase(self, anchor):
+        factor = 2.0 ** ((self.anchor - anchor) / self.half_life)
+        for key in self.scores:
+            self.scores[key] *= factor
+        self.anchor = anchor
+
+    def delete(self, key):
+        with self.lock:
+            if self.scores.pop(key, None) is not None:
+                self.append({'key': key, 'kind': 'delete', 'time': round(time.time(), 3)})
+
+    def score(self, key):
+        """缓存分数, 只用来比较 (和 sort key 一致)"""
+        return self.scores.get(key, 0.0)
+
+    def current_scores(self):
+        """{key: 衰减到现在的分数}, 大约等于最近 half_life 内的使用次数 (按权重); 可以交给其它线程"""
+        with self.lock:
+            factor = 2.0 ** ((self.anchor - time.time()) / self.half_life)
+            return {key: score * factor for key, score in self.scores.items()}
+
+    def compact(self):
+        with self.lock:
+            now = time.time()
+            tmp_path = self.log_path + '.tmp'
+            try:
+                with open(tmp_path, 'wb') as f:
+                    for key, score in self.current_scores().items():
+                        record = {'key': key, 'kind': 'score', 'weight': score, 'time': round(now, 3)}
+                        f.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+                os.replace(tmp_path, self.log_path)
+            except OSError as e:
+                print(f"Error compacting usage log: {e}")
+                return
+            self.log_lines = len(self.scores)
+
+
+def benchmark(snippet_count=100000, event_count=200000):
+    # python snippet_usage.py [snippet_count]
+    import random
+    import tempfile
+    random.seed(0)
+    log_path = os.path.join(tempfile.mkdtemp(), 'usage.log')
+    usage = SnippetUsage(log_path, compact_lines=event_count * 2)
+    # 少数 snippet 被经常使用
+    keys = [f'data/snippet_{int(random.paretovariate(1.2)) % snippet_count:08d}.json' for _ in range(event_count)]
+    start = time.perf_counter()
+    for key in keys:
+        usage.record(key, random.choice(('select', 'select', 'copy')))
+    elapsed = time.perf_counter() - start
+    print(f'record x{event_count}: {elapsed / event_count * 1e6:.1f} us each, {len(usage.scores)} snippets used')
+
+    # 排序直接用缓存的分数; 对比每次从日志重新聚合一遍 (也就是启动时的 load)
+    start = time.perf_counter()
+    top = sorted(usage.scores, key=usage.scores.__getitem__, reverse=True)[:10]
+    cached = time.perf_counter() - start
+    start = time.perf_counter()
+    SnippetUsage(log_path, compact_lines=event_count * 2)
+    rescan = time.perf_counter() - start
+    print(f'rank from cached scores {cached * 1000:.1f} ms, rescanning {event_count} logged events {rescan * 1000:.0f} ms, '
+          f'top {top[0]}')
+
+    start = time.perf_counter()
+    usage.compact()
+    print(f'compact: {(time.perf_counter() - start) * 1000:.0f} ms')
+    start = time.perf_counter()
+    SnippetUsage(log_path)
+    print(f'load after compact: {(time.perf_counter() - start) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
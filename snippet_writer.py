@@ -0,0 +1,72 @@
+from background_worker import BackgroundWorker
+
+
+class SnippetWriter(BackgroundWorker):
+    """后台写盘队列: 同一个 snippet 的多次修改只保留最新的一份, 由工作线程写入 store"""
+
+    def __init__(self, store, history=None, search_index=None):
+        self.store = store
+        self.history = history
+        self.search_index = search_index
+        self.queue = {}  # key -> snippet, 按提交顺序
+        self.in_flight = None
+        self.in_flight_snippet = None
+        self.start_thread('SnippetWriter')
+
+    def submit(self, key, snippet):
+        with self.condition:
+            # 还没写出去的旧版本直接被覆盖
+            self.queue.pop(key, None)
+            self.queue[key] = snippet
+            self.condition.notify_all()
+
+    def latest(self, key):
+        # 还在排队或者正在写的那一份, 比 store 里的新; 没有时返回 None
+        with self.condition:
+            snippet = self.queue.get(key)
+            if snippet is None and self.in_flight == key:
+                snippet = self.in_flight_snippet
+            return snippet
+
+    def discard(self, key):
+        # 删除 snippet 前调用, 丢掉未写的修改并等待正在写的那一次完成; 返回丢掉的那一份 (没有时 None)
+        with self.condition:
+            snippet = self.queue.pop(key, None)
+            while self.in_flight == key:
+                self.condition.wait()
+            return snippet
+
+    def flush(self):
+        with self.condition:
+            while self.queue or self.in_flight is not None:
+                self.condition.wait()
+
+    def close(self):
+        # 关闭前把队列里的都写完
+        self.flush()
+        super().close()
+
+    def has_request(self):
+        return bool(self.queue)
+
+    def take_request(self):
+        key = next(iter(self.queue))
+        snippet = self.queue.pop(key)
+        self.in_flight = key
+        self.in_flight_snippet = snippet
+        return key, snippet
+
+    def finish_request(self, request):
+        self.in_flight = None
+        self.in_flight_snippet = None
+
+    def handle(self, request):
+        key, snippet = request
+        try:
+            self.store.save(key, snippet)
+            if self.history is not None:
+                self.history.record(key, snippet)
+            if self.search_index is not None:
+                self.search_index.update(key, snippet)
+        except Exception as e:
+            print(f"Error saving snippet {key}: {e}")
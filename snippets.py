@@ -1,28 +1,69 @@
 import sys
-import re
 import os
-import json
+import time
 import datetime
-import markdown
+import threading
 
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QTextEdit, QShortcut, QLineEdit, QPushButton, QHBoxLayout, QGridLayout, QMessageBox, QAction, QCheckBox, QHeaderView, QLabel, QTreeView, QSplitter, QComboBox, QAbstractItemView
-from PyQt5.QtGui import QColor, QTextCharFormat, QFont, QSyntaxHighlighter, QKeySequence, QStandardItemModel, QStandardItem, QIcon, QKeyEvent, QTextCursor
-from PyQt5.QtCore import Qt, QItemSelectionModel, QItemSelection, QSettings, QRegularExpression, QSortFilterProxyModel, QModelIndex, QMimeData, QTimer
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QTextEdit, QShortcut, QLineEdit, QPushButton, QHBoxLayout, QGridLayout, QMessageBox, QAction, QCheckBox, QHeaderView, QLabel, QTreeView, QSplitter, QComboBox, QAbstractItemView, QMenu, QFileDialog, QProgressDialog, QInputDialog
+from PyQt5.QtGui import QColor, QTextCharFormat, QFont, QSyntaxHighlighter, QKeySequence, QIcon, QKeyEvent, QTextCursor, QPalette
+from PyQt5.QtCore import Qt, QItemSelectionModel, QItemSelection, QSettings, QRegularExpression, QSortFilterProxyModel, QModelIndex, QMimeData, QTimer, pyqtSignal
 
 from text_edit_search import TextEditSearch
 from line_edit_past_date import LineEditPasteDate
 from syntax_highlighter import PythonHighlighter, CppHighlighter, PlainTextHighlighter
 from tree_view_proxy import RecursiveFilterProxyModel
+from snippet_tree_model import SnippetTreeModel, COLUMN_FILE, SORT_ROLE, SORT_USAGE, normalize_folder
 from text_edit_optimized_tab import TextEditOptimizedTab
 from search_box_history import SearchBoxHistory
+from snippet_store import create_store, DEFAULT_COMPRESS_THRESHOLD
+from data_dir_watcher import DataDirWatcher
+from snippet_writer import SnippetWriter
+from chunked_text_loader import ChunkedTextLoader
+from snippet_archive import import_snippets, export_snippets
+from snippet_history import SnippetHistory
+from snippet_usage import SnippetUsage
+from placeholder_index import PlaceholderIndex
+from placeholder_template import TemplateRenderer
+from preview_patcher import PreviewPatcher
+from markdown_renderer import MarkdownRenderWorker
+from snippet_search_index import SnippetSearchIndex
+from tree_filter_worker import TreeFilterWorker
 
 class MainWindow(QWidget):
+    # 后台线程建好 (或更新完) 全文索引
+    search_index_ready = pyqtSignal()
+
     def __init__(self):
         super().__init__()
 
+        app_name = 'Snippets Everything'
+        self.settings = QSettings("Philips", app_name)
+
         self.data_dir = 'data'
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
+        # 存储后端: 'json' (每个 snippet 一个文件) 或 'sqlite' (单文件)
+        storage_backend = self.settings.value('storage_backend', defaultValue='json', type=str)
+        cache_bytes = self.settings.value('snippet_cache_bytes', defaultValue=32 * 1024 * 1024, type=int)
+        # content 超过阈值时压缩存储, 0 表示不压缩
+        compress_threshold = self.settings.value('compress_threshold', defaultValue=DEFAULT_COMPRESS_THRESHOLD, type=int)
+        compress_codec = self.settings.value('compress_codec', defaultValue='zlib', type=str)
+        self.store = create_store(storage_backend, self.data_dir, cache_bytes, compress_threshold, compress_codec)
+        # 每次保存追加一个修订 (delta + 定期 checkpoint), 可以恢复到任意历史版本
+        self.history = SnippetHistory(os.path.join(self.data_dir, 'history'))
+        # 使用记录 (选中, 复制预览) 聚合成的 frecency 分数, 用来排序和给模糊搜索加分
+        self.usage = SnippetUsage(os.path.join(self.data_dir, 'usage.log'),
+                                  self.settings.value('usage_half_life_days', defaultValue=14, type=int))
+        self.usage_dirty = True
+        # 选中后停留这么久才算一次使用, 用方向键浏览经过的不算
+        self.usage_timer = QTimer(self)
+        self.usage_timer.setSingleShot(True)
+        self.usage_timer.setInterval(self.settings.value('usage_select_ms', defaultValue=2000, type=int))
+        self.usage_timer.timeout.connect(self.record_select_usage)
+        QApplication.clipboard().dataChanged.connect(self.clipboard_changed_slot)
+        # 正文和 placeholder 值的全文索引, 启动时在后台线程建立, 之后随保存/添加/删除增量更新
+        self.search_index = SnippetSearchIndex()
+        self.search_index_ready.connect(self.search_index_ready_slot)
+        # 保存在后台线程进行, 同一个 snippet 的多次修改合并成一次写入
+        self.snippet_writer = SnippetWriter(self.store, self.history, self.search_index)
 
         # 添加搜索框
         self.add_button = QPushButton("+")
@@ -31,7 +72,7 @@ class MainWindow(QWidget):
         self.delete_button.setMaximumWidth(40)
 
         self.search_box = SearchBoxHistory(self)
-        self.search_box.setPlaceholderText("Search in tree")
+        self.search_box.setPlaceholderText("Search in tree  (type: title: body: placeholder: after: before:)")
         self.search_box.currentTextChanged.connect(self.filter_tree_view_slot)
 
         self.save_search_btn = QPushButton('Save Keywords')
@@ -39,12 +80,31 @@ class MainWindow(QWidget):
         self.save_search_btn.setMaximumWidth(110)
         self.save_search_btn.setMaximumHeight(110)
 
-        self.regex_cache = {}
 
         self.regex_check_box = QCheckBox('Regex')
         self.regex_check_box.setCheckState(Qt.CheckState.Unchecked)
         self.regex_check_box.setMaximumWidth(60)
         self.regex_check_box.setMaximumHeight(110)
+        self.regex_check_box.stateChanged.connect(self.run_tree_filter)
+
+        # 模糊搜索: 按 title 打分, 只显示排名前 fuzzy_top_k 的 snippet
+        self.fuzzy_check_box = QCheckBox('Fuzzy')
+        self.fuzzy_check_box.setCheckState(Qt.CheckState.Unchecked)
+        self.fuzzy_check_box.setMaximumWidth(60)
+        self.fuzzy_check_box.setMaximumHeight(110)
+        self.fuzzy_check_box.stateChanged.connect(self.run_tree_filter)
+        self.tree_rows_dirty = True
+
+        # 过滤在后台线程计算: 输入停顿 filter_debounce_ms 之后才提交, 旧的查询会被新的取消
+        self.tree_filter_worker = TreeFilterWorker(self.search_index,
+                                                   self.settings.value('fuzzy_top_k', defaultValue=500, type=int),
+                                                   parent=self)
+        self.tree_filter_worker.filtered.connect(self.apply_tree_filter_result)
+        self.tree_filter_generation = 0
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(self.settings.value('filter_debounce_ms', defaultValue=150, type=int))
+        self.filter_timer.timeout.connect(self.run_tree_filter)
         
         self.search_widget = QWidget()
         self.search_widget.setLayout(QGridLayout())
@@ -52,15 +112,16 @@ class MainWindow(QWidget):
         self.search_widget.layout().addWidget(self.delete_button, 0, 1)
         self.search_widget.layout().addWidget(self.search_box, 0, 2)
         self.search_widget.layout().addWidget(self.regex_check_box, 0, 3)
-        self.search_widget.layout().addWidget(self.save_search_btn, 0, 4)
+        self.search_widget.layout().addWidget(self.fuzzy_check_box, 0, 4)
+        self.search_widget.layout().addWidget(self.save_search_btn, 0, 5)
         self.search_widget.layout().setContentsMargins(0, 0, 0, 0)
 
 
         self.hor_splitter = QSplitter(Qt.Horizontal)
         self.hor_splitter.setObjectName("hor_splitter")
 
-        self.content_loaded_from_json = None
         self.title_loaded_from_json = None
+        self.folder_loaded_from_json = None
         self.placeholder_dict_loaded_from_json = None
         self.content_type_loaded_from_json = None
 
@@ -69,14 +130,27 @@ class MainWindow(QWidget):
         self.tree.setHorizontalScrollMode(QTreeView.ScrollPerPixel)  # 设置水平滚动策略
         self.tree.setAutoScroll(False)
         self.tree.setSortingEnabled(True)  # 启用排序功能
-        self.tree_model = QStandardItemModel()
-        self.tree_model.setHorizontalHeaderLabels(['Title', 'Type', 'Created Time'])
+        self.tree.setUniformRowHeights(True)  # 行高一致, 视图不用逐行计算高度
+        self.tree_model = SnippetTreeModel()
 
         self.proxy_model = RecursiveFilterProxyModel()
         self.proxy_model.setSourceModel(self.tree_model)
-        self.proxy_model.setFilterCaseSensitivity(Qt.CaseInsensitive)  # 不区分大小写
+        self.proxy_model.set_key_column(COLUMN_FILE)
+        # 按预先算好的 key 排序 (timestamp 按时间而不是字符串, type 按固定顺序)
+        self.proxy_model.setSortRole(SORT_ROLE)
+        self.tree_model.usage_scores = self.usage.scores
+        # tree 有任何修改 (包括还没展开的文件夹), 下次搜索时把行重新交给后台线程 (模糊搜索的候选和字段查询的元数据)
+        self.tree_model.snippets_changed.connect(self.invalidate_tree_rows)
+        self.tree_model.modelReset.connect(self.invalidate_tree_rows)
+        # 过滤结果是按 key 给出的, 新增的行要重新过滤一次才会出现
+        self.tree_model.snippets_changed.connect(self.refilter_after_insert)
 
         self.tree.setModel(self.proxy_model)
+        # 默认按使用频率排序 (不显示表头的排序标记), 点表头换成按列排序
+        self.tree_sort_by_usage = False
+        self.tree.header().sectionClicked.connect(self.tree_header_clicked)
+        if self.settings.value('tree_sort_by_usage', defaultValue=True, type=bool):
+            self.sort_tree_by_usage(True)
         self.tree.setEditTriggers(QTreeView.NoEditTriggers)  # 不允许修改内容
         self.tree.setSelectionMode(QTreeView.SingleSelection)  # 设置选择模式为单选
         self.tree.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
@@ -84,6 +158,9 @@ class MainWindow(QWidget):
         # self.tree.clicked.connect(self.on_tree_item_clicked)
         self.tree.selectionModel().selectionChanged.connect(self.on_selection_changed)
 
+        self.tree.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.tree.customContextMenuRequested.connect(self.show_tree_context_menu)
+
         widget_with_tree_search = QWidget()
         widget_with_tree_search.setLayout(QVBoxLayout())
         widget_with_tree_search.layout().addWidget(self.search_widget)
@@ -102,11 +179,18 @@ class MainWindow(QWidget):
         self.title_lineedit.textChanged.connect(self.title_changed_slot)
         # 允许 title_lineedit 被修改
         self.title_lineedit.setReadOnly(False)
+        # snippet 所在的文件夹, 'a/b' 表示多级
+        self.folder_lineedit = QLineEdit()
+        self.folder_lineedit.setPlaceholderText('Folder')
+        self.folder_lineedit.setMaximumWidth(160)
+        self.folder_lineedit.textChanged.connect(self.folder_changed_slot)
         self.type_combobox = QComboBox()
         self.type_combobox.addItems(['Plain text', 'Python', 'C++', 'Markdown'])
         self.type_combobox.currentTextChanged.connect(self.apply_highlighter)
+        self.type_combobox.currentTextChanged.connect(self.type_changed_slot)
 
         info_layout.addWidget(self.title_lineedit)
+        info_layout.addWidget(self.folder_lineedit)
         info_layout.addWidget(self.type_combobox)
 
         right_layout.addLayout(info_layout)
@@ -125,6 +209,11 @@ class MainWindow(QWidget):
         self.text_edit.setFont(font)
 
         self.text_edit_search = TextEditSearch(self.text_edit)
+        # 每行的 placeholder 跟着文档修改增量更新, 按键时不用整篇重新扫描
+        self.placeholder_index = PlaceholderIndex(self.text_edit.document(), parent=self)
+        # 内容编译成模板, 输入框修改时只把值填进去; 内容/值/类型都没变时预览不重新渲染
+        self.template_renderer = TemplateRenderer()
+        self.preview_key = None
 
         self.text_edit_replaced = QTextEdit(self)
         self.text_edit_replaced.setFont(font)
@@ -135,6 +224,8 @@ class MainWindow(QWidget):
         self.highlighter_replaced = None
 
         self.text_edit.textChanged.connect(self.text_edit_changed)
+        # 只有 placeholder 有增减或者顺序变了才重建输入框
+        self.placeholder_index.placeholders_changed.connect(self.placeholders_changed_slot)
 
         self.right_vert_splitter = QSplitter(Qt.Vertical, self)
         self.right_vert_splitter.setObjectName("right_vert_splitter")
@@ -153,11 +244,42 @@ class MainWindow(QWidget):
         # self.save_button.clicked.connect(self.save_snippet)
         # right_layout.addWidget(self.save_button)
 
-        self.interval_save_timer = QTimer()
-        self.interval_save_timer.setInterval(2000)
-        self.interval_save_timer.start()
-
-        self.interval_save_timer.timeout.connect(self.save_snippet_changes)
+        # 有修改时才启动的自动保存定时器, 空闲时不做任何轮询
+        self.dirty_fields = set()
+        self.dirty_since = 0.0
+        self.loading_snippet = False
+        # 外部修改和本地修改冲突, 正在问用户
+        self.resolving_conflict = False
+        self.autosave_max_delay = 5.0
+        self.autosave_timer = QTimer()
+        self.autosave_timer.setSingleShot(True)
+        self.autosave_timer.setInterval(1000)
+        self.autosave_timer.timeout.connect(self.save_snippet_changes)
+
+        # 大文档模式: 超过阈值的 snippet 分块加载, 只高亮可见区域, 预览延迟渲染
+        self.large_document_threshold = self.settings.value('large_document_chars', defaultValue=1024 * 1024, type=int)
+        self.large_document_mode = False
+        self.pending_snippet = None
+        self.chunk_loader = ChunkedTextLoader(self.text_edit, parent=self)
+        self.chunk_loader.finished.connect(self.chunked_load_finished)
+        self.preview_chunk_loader = ChunkedTextLoader(self.text_edit_replaced, parent=self)
+        self.preview_chunk_loader.finished.connect(self.preview_chunks_loaded)
+        self.preview_pending_lines = None
+        # 预览只替换变化的 block; 连续的修改合并成每帧最多一次更新
+        self.preview_patcher = PreviewPatcher(self.text_edit_replaced)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(self.settings.value('preview_interval_ms', defaultValue=16, type=int))
+        self.preview_timer.timeout.connect(self.render_preview)
+        # Markdown 预览在后台线程渲染, 每个顶层 block 的结果都缓存, 改一段只重新渲染这一段
+        self.markdown_worker = MarkdownRenderWorker(parent=self)
+        self.markdown_worker.rendered.connect(self.apply_markdown_preview)
+        self.markdown_generation = 0
+
+        self.deferred_preview_timer = QTimer()
+        self.deferred_preview_timer.setSingleShot(True)
+        self.deferred_preview_timer.setInterval(500)
+        self.deferred_preview_timer.timeout.connect(self.render_preview)
 
         self.delete_button.clicked.connect(self.delete_snippet)
         self.add_button.clicked.connect(self.add_snippet)
@@ -172,11 +294,23 @@ class MainWindow(QWidget):
 
         self.load_snippets()
         self.current_snippet_file = None
-
-        if self.proxy_model.rowCount() > 0:
-            first_row_index = self.proxy_model.index(0, 0)
-            self.select_tree_item_by_proxy_index(first_row_index)
+        self.index_snippets_in_background(self.store.iter_snippets())
+
+        # data 目录被外部修改时增量更新 tree_model, 不做整体 reload
+        self.data_dir_watcher = None
+        if hasattr(self.store, 'scan_changes'):
+            self.data_dir_watcher = DataDirWatcher(self.store, parent=self)
+            self.data_dir_watcher.snippets_changed.connect(self.apply_external_changes)
+
+        # 文件夹排在最前面, 选中第一个 snippet
+        for row in range(self.proxy_model.rowCount()):
+            first_row_index = self.proxy_model.index(row, 0)
+            if self.tree_model.leaf_row(self.proxy_model.mapToSource(first_row_index).row(), QModelIndex()) >= 0:
+                self.select_tree_item_by_proxy_index(first_row_index)
+                break
             # self.handle_item_selection_by_proxy_index(first_row_index)
+        # 启动时自动选中的不算使用
+        self.usage_timer.stop()
 
         self.shortcut = QShortcut(QKeySequence("Ctrl+L"), self)
         self.shortcut.activated.connect(self.set_focus_to_search_box)
@@ -188,18 +322,23 @@ class MainWindow(QWidget):
         self.shortcut.activated.connect(self.set_focus_to_text_edit)
 
 
-        app_name = 'Snippets Everything'
         self.setWindowTitle(app_name)
         self.setGeometry(100, 100, 800, 600)
         self.setWindowIcon(QIcon('pen.ico'))
-        self.settings = QSettings("Philips", app_name)
 
         self.load_settings()
 
     def closeEvent(self, event):
         self.save_snippet()
+        # 退出前保证所有修改都已写盘
+        self.snippet_writer.close()
+        self.tree_filter_worker.close()
+        self.markdown_worker.close()
+        if self.data_dir_watcher is not None:
+            self.data_dir_watcher.close()
 
         self.save_settings()
+        self.store.close()
         event.accept()
 
 
@@ -216,6 +355,7 @@ class MainWindow(QWidget):
         for col in range(column_count):
             width = self.tree.columnWidth(col)
             self.settings.setValue(f"tree_column_width/{col}", width)
+        self.settings.setValue('tree_sort_by_usage', self.tree_sort_by_usage)
 
 
 
@@ -248,60 +388,95 @@ class MainWindow(QWidget):
     def set_focus_to_text_edit(self):
         self.text_edit.setFocus()
 
+    def invalidate_tree_rows(self, *args):
+        self.tree_rows_dirty = True
+
+    def refilter_after_insert(self, rows, inserted):
+        if inserted and self.search_box.currentText():
+            self.filter_timer.start()
+
     def filter_tree_view_slot(self, text):
-        if self.regex_check_box.isChecked():
-            if text in self.regex_cache:
-                regex = self.regex_cache[text]
-            else:
-                regex = QRegularExpression(text)
-                self.regex_cache[text] = regex
+        # 每次按键只重启计时器, 停顿之后才真正过滤
+        self.filter_timer.start()
+
+    def run_tree_filter(self, *args):
+        self.filter_timer.stop()
+        text = self.search_box.currentText()
+        fuzzy = self.fuzzy_check_box.isChecked()
+        if not (text.strip() if fuzzy else text):
+            self.tree_filter_worker.cancel()
+            self.tree_filter_generation = 0
+            self.proxy_model.set_accepted_keys(None)
+            return
 
-            if regex.isValid():
-                # print(f"set regex: '{text}'")
-                self.proxy_model.setFilterRegularExpression(regex)
-                self.tree.expandAll()
+        rows = None
+        if self.tree_rows_dirty:
+            rows = list(self.tree_model.iter_rows())
+            self.tree_rows_dirty = False
+        usage = None
+        if self.usage_dirty:
+            usage = self.usage.current_scores()
+            self.usage_dirty = False
+        # 后台线程只读快照, 正文命中的 snippet 也显示; 字段查询里的普通搜索词也要用 haystack
+        self.tree_filter_generation = self.tree_filter_worker.submit(
+            text, regex=self.regex_check_box.isChecked(), fuzzy=fuzzy,
+            haystacks=self.proxy_model.snapshot_haystacks(), rows=rows, usage=usage)
+
+    def apply_tree_filter_result(self, generation, keys, ranked):
+        if generation != self.tree_filter_generation:
+            # 已经有更新的查询
+            return
+        # 整个结果只 invalidate 一次
+        self.proxy_model.set_accepted_keys(keys, ranked=ranked)
+        # 只有真的有文件夹时才需要展开
+        if self.tree_model.root.folders:
+            self.tree.expandAll()
+
+    def index_snippets_in_background(self, items):
+        # items 可以是生成器, 在后台线程里才真正读取 snippet
+        def run():
+            try:
+                start = time.perf_counter()
+                count = self.search_index.build(items)
+                print(f'search index => {count} snippets indexed in {time.perf_counter() - start:.2f}s')
+            except Exception as e:
+                print(f"Error building search index: {e}")
                 return
+            self.search_index_ready.emit()
+
+        threading.Thread(target=run, name='SnippetSearchIndex', daemon=True).start()
 
-        # print(f"set filter wildcard: '{text}'")
-        self.proxy_model.setFilterRegularExpression(text)
-        self.proxy_model.setFilterCaseSensitivity(Qt.CaseInsensitive)  # 不区分大小写
-        self.tree.expandAll()
+    def iter_loaded_snippets(self, keys):
+        for key in keys:
+            try:
+                yield key, self.load_snippet(key)
+            except Exception as e:
+                print(f"Error loading {key}: {e}")
+
+    def load_snippet(self, key):
+        # 还没写到 store 的修改优先, 否则刚保存完马上读回来会拿到旧内容
+        snippet = self.snippet_writer.latest(key)
+        if snippet is not None:
+            return dict(snippet)
+        return self.store.load(key)
+
+    def search_index_ready_slot(self):
+        if self.search_box.currentText():
+            self.run_tree_filter()
 
     def load_snippets(self):
-        self.tree_model.clear()
-        self.tree_model.setHorizontalHeaderLabels(['Title', 'Type', 'File', 'Timestamp'])
         self.tree.setColumnHidden(2, True) 
         # self.tree.setColumnHidden(3, True) 
 
-        snippets = []
-        for filename in os.listdir(self.data_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(self.data_dir, filename)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        snippet = json.load(f)
-                        snippet['file_path'] = file_path
-                        snippets.append(snippet)
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
+        # 只读取元数据, snippet 内容在选中时才读取
+        snippets = self.store.list_metadata()
 
         # 按创建时间排序
         snippets.sort(key=lambda x: x.get('timestamp', ''))
-        for snippet in snippets:
-
-            title = snippet.get('title', 'Unknown')
-            title_item = QStandardItem(title)
-            
-            snippet_type = snippet.get('type', 'Unknown')
-            type_item = QStandardItem(snippet_type)
-            
-            file_path = snippet.get('file_path', '')
-            file_path_item = QStandardItem(file_path)
-
-            timestamp = snippet.get('timestamp', '')
-            timestamp_item = QStandardItem(timestamp)
-            
-            self.tree_model.appendRow([title_item, type_item, file_path_item, timestamp_item])
+        rows = [(snippet.get('title', 'Unknown'), snippet.get('type', 'Unknown'),
+                 snippet.get('file_path', ''), snippet.get('timestamp', ''), snippet.get('folder', ''))
+                for snippet in snippets]
+        self.tree_model.set_rows(rows)
 
         # self.tree.header().setSectionResizeMode(0, QHeaderView.ResizeToContents)
         # self.tree.header().setSectionResizeMode(1, QHeaderView.ResizeToContents)
@@ -312,13 +487,45 @@ class MainWindow(QWidget):
         if selected.indexes():
             index = selected.indexes()[0]
 
-            item = self.tree_model.itemFromIndex(self.proxy_model.mapToSource(index))
-            if item is None:
-                return
-            _, _, file_path_from_tree = self.get_items_1_2_3(item, index)
-            if file_path_from_tree is None:
-                return
-            self.handle_item_selection_by_file_path(file_path_from_tree)
+            self.handle_item_selection_by_proxy_index(index)
+            self.usage_timer.start()
+
+    def record_select_usage(self):
+        if self.current_snippet_file is not None:
+            self.record_usage(self.current_snippet_file, 'select')
+
+    def clipboard_changed_slot(self):
+        # 从预览里复制 (菜单或 Ctrl+C) 算一次使用
+        if self.current_snippet_file is None:
+            return
+        selected = self.text_edit_replaced.textCursor().selectedText()
+        if selected and selected.replace('\u2029', '\n') == QApplication.clipboard().text():
+            self.record_usage(self.current_snippet_file, 'copy')
+
+    def record_usage(self, key, kind):
+        try:
+            self.usage.record(key, kind)
+        except Exception as e:
+            print(f"Error recording usage for {key}: {e}")
+            return
+        self.usage_dirty = True
+        # 只更新这一行的排序 key, 按使用频率排序时移到新位置
+        self.tree_model.update_usage(key)
+
+    def sort_tree_by_usage(self, enabled):
+        self.tree_sort_by_usage = enabled
+        header = self.tree.header()
+        header.setSortIndicatorShown(not enabled)
+        if enabled:
+            self.proxy_model.sort(SORT_USAGE, Qt.DescendingOrder)
+        else:
+            self.proxy_model.sort(header.sortIndicatorSection(), header.sortIndicatorOrder())
+
+    def tree_header_clicked(self, section):
+        # 表头已经按点击的列排好序了, 只需要显示排序标记
+        if self.tree_sort_by_usage:
+            self.tree_sort_by_usage = False
+            self.tree.header().setSortIndicatorShown(True)
 
     # def on_tree_item_clicked(self, index):
     #     item = self.tree_model.itemFromIndex(self.proxy_model.mapToSource(index))
@@ -329,155 +536,192 @@ class MainWindow(QWidget):
     #         return
     #     self.handle_item_selection_by_file_path(file_path_from_tree)
 
-    def save_snippet_changes(self):
+    def mark_dirty(self, field):
+        if self.loading_snippet or self.chunk_loader.isActive() or self.current_snippet_file is None:
+            return
+
+        now = time.monotonic()
+        if not self.dirty_fields:
+            self.dirty_since = now
+        self.dirty_fields.add(field)
+
+        # 每次修改都重新计时, 但连续输入时最多推迟 autosave_max_delay 秒
+        if not self.autosave_timer.isActive() or now - self.dirty_since < self.autosave_max_delay:
+            self.autosave_timer.start()
+
+    def changed_fields(self):
+        # 和加载时的值逐项比较; dirty_fields 只是提示 (重新高亮也会触发 textChanged)
         changes = []
-        if self.content_loaded_from_json is not None and self.text_edit.toPlainText() != self.content_loaded_from_json:
+        # 用 QTextDocument 的修改状态判断, 不需要 toPlainText() 整体比较
+        if self.text_edit.document().isModified():
             # print('content changed, need to save!!!')
             changes.append('content')
-            self.save_snippet()
-            self.content_loaded_from_json = self.text_edit.toPlainText()
-        # else:
-        #     print(f'content_loaded_from_json={self.content_loaded_from_json}')
-        #     print('content not changed')
 
         if self.title_loaded_from_json is not None and self.title_lineedit.text() != self.title_loaded_from_json:
             # print('title changed, need to save!!!')
             changes.append('title')
-            self.save_snippet()
-            self.title_loaded_from_json = self.title_lineedit.text()
         # else:
         #     print('title not changed')
 
+        if self.folder_loaded_from_json is not None and normalize_folder(self.folder_lineedit.text()) != self.folder_loaded_from_json:
+            changes.append('folder')
+
         if self.content_type_loaded_from_json is not None and self.type_combobox.currentText() != self.content_type_loaded_from_json:
             # print('type_combobox changed, need to save!!!')
             changes.append('content type')
-            self.save_snippet()
-            self.content_type_loaded_from_json = self.type_combobox.currentText()
         # else:
             # print('type_combobox not changed')
 
-        previous_values = {placeholder: input_field.text() for placeholder, input_field in self.input_widgets.items()}
-        if self.placeholder_dict_loaded_from_json is not None and previous_values != self.placeholder_dict_loaded_from_json:
+        if self.placeholder_dict_loaded_from_json is not None and self.placeholder_values() != self.placeholder_dict_loaded_from_json:
             # print('placeholder_dict_loaded_from_json changed, need to save!!!')
             changes.append('placeholder')
-            self.save_snippet()
-            self.placeholder_dict_loaded_from_json = previous_values
         # else:
             # print('placeholder_dict_loaded_from_json not changed')
+        return changes
+
+    def save_snippet_changes(self):
+        self.autosave_timer.stop()
+        if not self.dirty_fields:
+            return
+        self.dirty_fields.clear()
+
+        changes = self.changed_fields()
         if len(changes) > 0:
             print(f'changes={changes}')
+            if 'title' in changes:
+                self.title_loaded_from_json = self.title_lineedit.text()
+            if 'folder' in changes:
+                self.folder_loaded_from_json = normalize_folder(self.folder_lineedit.text())
+            if 'content type' in changes:
+                self.content_type_loaded_from_json = self.type_combobox.currentText()
+            if 'placeholder' in changes:
+                self.placeholder_dict_loaded_from_json = self.placeholder_values()
+            # 所有字段的修改只保存一次
+            self.save_snippet()
 
-    def get_items_1_2_3(self, item, index):
-        item_column_1 = None
-        item_column_2 = None
-        item_column_3 = None
-
-        if item:
-            if index.column() == 0:  # 点击的是第一列
-                item_column_1 = item
-                parent_item = item.parent()
-                if parent_item is None:
-                    parent_item = self.tree_model.invisibleRootItem()
-
-                item_column_2 = parent_item.child(item.row(), 1)
-                item_column_3 = parent_item.child(item.row(), 2)
-
-            elif index.column() == 1:  # 点击的是第二列
-                item_column_2 = item
-                parent_item = item.parent()
-                if parent_item is None:
-                    parent_item = self.tree_model.invisibleRootItem()
-                item_column_1 = parent_item.child(item.row(), 0)
-                item_column_3 = parent_item.child(item.row(), 2)
-
-            elif index.column() == 2:  # 点击的是第三列
-                item_column_3 = item
-                parent_item = item.parent()
-                if parent_item is None:
-                    parent_item = self.tree_model.invisibleRootItem()
-                item_column_1 = parent_item.child(item.row(), 0)
-                item_column_2 = parent_item.child(item.row(), 1)
-
-        return item_column_1, item_column_2, item_column_3
+    def get_items_1_2_3(self, index):
+        # 返回 proxy index 所在行的 (title, type, file_path), 文件夹返回 None
+        source_index = self.proxy_model.mapToSource(index)
+        if not source_index.isValid():
+            return None, None, None
+        row = self.tree_model.leaf_row(source_index.row(), source_index.parent())
+        if row < 0:
+            return None, None, None
+        title, snippet_type, file_path, _ = self.tree_model.row_values(row)
+        return title, snippet_type, file_path
     
     def handle_item_selection_by_proxy_index(self, index):
 
-        item = self.tree_model.itemFromIndex(self.proxy_model.mapToSource(index))
-        if item is None:
-            return
-
-        _, _, file_path_from_tree = self.get_items_1_2_3(item, index)
+        _, _, file_path_from_tree = self.get_items_1_2_3(index)
         if file_path_from_tree is None:
             return
 
         self.handle_item_selection_by_file_path(file_path_from_tree)
 
 
-    def handle_item_selection_by_file_path(self, file_path_from_tree):
+    def handle_item_selection_by_file_path(self, file_path):
         self.save_snippet_changes()
+        self.open_snippet(file_path)
+
+    def open_snippet(self, file_path):
+        # 只读取, 不保存当前的修改
+        try:
+            snippet = self.load_snippet(file_path)
+        except Exception as e:
+            print(f"Error loading {file_path}: {e}")
+            return
+
+        # 加载过程中触发的各种 changed 信号不算修改
+        self.loading_snippet = True
+        try:
+            self.load_snippet_to_editor(file_path, snippet)
+        finally:
+            self.loading_snippet = False
+
+    def load_snippet_to_editor(self, file_path, snippet):
+        # 取消上一个还没加载完的大文档
+        self.chunk_loader.cancel()
+        self.preview_chunk_loader.cancel()
+        self.deferred_preview_timer.stop()
+        self.preview_timer.stop()
+        self.preview_key = None
+        self.preview_patcher.reset()
+        self.markdown_generation = 0
+        self.text_edit.setReadOnly(False)
+        self.pending_snippet = None
+
+        self.title_loaded_from_json = snippet.get('title', '')
+        self.title_lineedit.setText(self.title_loaded_from_json)
+        self.folder_loaded_from_json = normalize_folder(snippet.get('folder', ''))
+        self.folder_lineedit.setText(self.folder_loaded_from_json)
+        print(f'select => {file_path} title={self.title_loaded_from_json}')
+
+        content_type = snippet.get('type', 'Plain text')
+        type_index = self.type_combobox.findText(content_type)
+        self.type_combobox.setCurrentIndex(type_index)
+
+        self.content_type_loaded_from_json = content_type
+        self.current_snippet_file = file_path
+
+        content = snippet.get('content', '')
+        self.large_document_mode = len(content) > self.large_document_threshold
+        if self.large_document_mode:
+            print(f'large document mode => {len(content)} chars')
+            self.start_chunked_load(content, snippet)
+            return
+
+        self.text_edit.setPlainText(content)
+        self.finish_loading_snippet(snippet)
+
+    def start_chunked_load(self, content, snippet):
+        # 先装好只高亮可见区域的 highlighter, 高亮的开销分摊到每一块里; 加载期间只读
+        self.apply_highlighter(snippet.get('type', 'Plain text'))
+        self.text_edit_replaced.clear()
+        self.preview_key = None
+        self.preview_patcher.reset()
+        self.text_edit.setReadOnly(True)
+        self.pending_snippet = snippet
+        self.chunk_loader.load(content)
+
+    def chunked_load_finished(self):
+        self.text_edit.setReadOnly(False)
+
+        snippet = self.pending_snippet
+        self.pending_snippet = None
+        self.loading_snippet = True
+        try:
+            self.finish_loading_snippet(snippet)
+        finally:
+            self.loading_snippet = False
+
+    def finish_loading_snippet(self, snippet):
+        content_type = snippet.get('type', 'Plain text')
+        self.text_edit.document().setModified(False)
+
+        self.update_input_layout()
+
+        if not self.large_document_mode:
+            self.apply_highlighter(content_type)
+
+        self.placeholder_dict_loaded_from_json = dict()
+        for placeholder, value in snippet.items():
+            if placeholder.startswith('$') and placeholder in self.input_widgets:
+                # print(f'placeholder={placeholder} value={value}')
+                self.input_widgets[placeholder].setText(value)
+                self.placeholder_dict_loaded_from_json[placeholder] = value
+
+        self.replace_placeholders()
 
-        for filename in os.listdir(self.data_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(self.data_dir, filename)
-                try:
-
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        snippet = json.load(f)
-                        
-                        if file_path == file_path_from_tree.text():
-
-                            self.title_loaded_from_json = snippet.get('title', '')
-                            self.title_lineedit.setText(self.title_loaded_from_json)
-                            print(f'select => {file_path} title={self.title_loaded_from_json}')
-
-                            content_type = snippet.get('type', 'Plain text')
-                            type_index = self.type_combobox.findText(content_type)
-                            self.type_combobox.setCurrentIndex(type_index)
-
-                            self.content_type_loaded_from_json = content_type
-                            
-                            self.content_loaded_from_json = snippet.get('content', '')
-                            self.text_edit.setPlainText(self.content_loaded_from_json)
-
-
-                            self.update_input_layout()
-                            self.current_snippet_file = file_path
-                            
-                            self.apply_highlighter(content_type)
-
-                            self.placeholder_dict_loaded_from_json = dict()
-                            for placeholder, value in snippet.items():
-                                if placeholder.startswith('$') and placeholder in self.input_widgets:
-                                    # print(f'placeholder={placeholder} value={value}')
-                                    self.input_widgets[placeholder].setText(value)
-                                    self.placeholder_dict_loaded_from_json[placeholder] = value
-
-                            self.replace_placeholders()
-                            
-                            break
-
-                
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
-        
     def update_input_layout(self):
         # print('update_input_layout')
         # 保存之前输入框的值
         previous_values = {placeholder: input_field.text() for placeholder, input_field in self.input_widgets.items()}
 
-        code = self.text_edit.toPlainText()
-        placeholders = re.findall(r'\$\w+', code)
-        unique_placeholders = []
-        for placeholder in placeholders:
-            if placeholder not in unique_placeholders:
-                unique_placeholders.append(placeholder)
+        unique_placeholders = self.placeholder_index.placeholders()
 
         # 比较当前占位符和之前的占位符
         if unique_placeholders == self.previous_placeholders:
-            # 占位符没有变化，恢复之前的值
-            for placeholder, input_field in self.input_widgets.items():
-                if placeholder in previous_values:
-                    input_field.setText(previous_values[placeholder])
+            # 占位符没有变化, 输入框不用动, 只刷新预览
             self.replace_placeholders()
             return
 
@@ -518,79 +762,122 @@ class MainWindow(QWidget):
         self.previous_placeholders = unique_placeholders
         self.replace_placeholders()
 
-    def text_edit_changed(self):
+    def placeholders_changed_slot(self, placeholders):
+        # 大文档分块加载时等加载完再一起更新 (finish_loading_snippet)
+        if self.chunk_loader.isActive():
+            return
         self.update_input_layout()
 
+    def text_edit_changed(self):
+        if self.chunk_loader.isActive():
+            return
+        self.mark_dirty('content')
+        # 输入框由 placeholders_changed 更新, 这里只刷新预览
+        self.replace_placeholders()
+
     def title_changed_slot(self):
-        pass
+        self.mark_dirty('title')
+
+    def folder_changed_slot(self):
+        self.mark_dirty('folder')
+
+    def type_changed_slot(self):
+        self.mark_dirty('content type')
 
     def input_field_changed(self):
         # print('input_field_changed')
+        self.mark_dirty('placeholder')
         self.replace_placeholders()
 
-    def replace_placeholders_with_inputs(self, code, replacement_fmt=None):
-        for placeholder, input_field in self.input_widgets.items():
-            replacement = input_field.text()
-            if replacement:
-                if replacement_fmt is not None:
-                    code = code.replace(placeholder, replacement_fmt.format(replacement))
-                else:
-                    code = code.replace(placeholder, replacement)
-        return code
+    def placeholder_values(self):
+        return {placeholder: input_field.text() for placeholder, input_field in self.input_widgets.items()}
+
+    def replace_placeholders_with_inputs(self, values=None):
+        # 内容没变时不调用 toPlainText, 复用编译好的模板
+        values = self.placeholder_values() if values is None else values
+        return self.template_renderer.render(self.placeholder_index.revision, self.text_edit.toPlainText, values)
 
     def replace_placeholders(self):
+        if self.large_document_mode:
+            # 大文档的预览在停止输入后再渲染
+            self.deferred_preview_timer.start()
+            return
+        # 不重新计时: 一直在输入时也保证每帧更新一次
+        if not self.preview_timer.isActive():
+            self.preview_timer.start()
+
+    def render_preview(self):
         # print('replace_placeholders')
-        code = self.text_edit.toPlainText()
+        self.preview_timer.stop()
+        content_type = self.type_combobox.currentText()
+        values = self.placeholder_values()
+        preview_key = (self.placeholder_index.revision, tuple(values.items()), content_type, self.large_document_mode)
+        if preview_key == self.preview_key:
+            return
+        self.preview_key = preview_key
+        # 还没回来的 Markdown 结果作废
+        self.markdown_generation = 0
+        self.set_preview_text_color(content_type == 'Plain text' and not self.large_document_mode)
+
+        if self.large_document_mode:
+            # 大文档不走 HTML/Markdown, 纯文本; 第一次分块写入, 之后只替换变化的 block
+            replaced_code = self.replace_placeholders_with_inputs(values=values)
+            if self.preview_patcher.lines is None or self.preview_chunk_loader.isActive():
+                self.preview_pending_lines = replaced_code.split('\n')
+                self.preview_chunk_loader.load(replaced_code)
+            else:
+                self.preview_patcher.update(replaced_code.split('\n'))
+            return
 
         replaced_code = ''
-        if self.type_combobox.currentText() == 'Plain text':
-            replaced_code = self.replace_placeholders_with_inputs(code, '<span style="color: magenta; font-weight: bold;">{}</span>')
-            html = (f'<p style="white-space: pre-wrap; color: green;">{replaced_code}</p>')
-            self.text_edit_replaced.setHtml(html)
-
-        elif self.type_combobox.currentText() == 'Markdown':
-            replaced_code = self.replace_placeholders_with_inputs(code)
-            html_body = markdown.markdown(replaced_code, extensions=['fenced_code'])
-            # print(f'html_body={html_body}')
-            html_template = f"""
-                <!DOCTYPE html>
-                <html lang="en">
-                <head>
-                    <meta charset="UTF-8">
-                    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                    <title>Code Block Example</title>
-                    <style>
-                        pre code {{
-                            font-family: 'Courier New', Courier, monospace;
-                            border: 1px solid #ccc;
-                            border-radius: 3px;
-                            padding: 2px 5px;
-                            color: #c7254e;
-                            white-space: pre-wrap;
-                            word-wrap: break-word;
-                        }}
-                    </style>
-                </head>
-                <body>
-                    {html_body}
-                </body>
-                </html>
-            """
-            self.text_edit_replaced.setHtml(html_template)
+        if content_type == 'Plain text':
+            # 纯文本写入, 不经过 HTML (内容里的 < 和 & 原样显示); 填进去的值用 ExtraSelections 标出来
+            replaced_code, ranges = self.template_renderer.render_ranges(self.placeholder_index.revision,
+                                                                         self.text_edit.toPlainText, values)
+            self.preview_patcher.update(replaced_code.split('\n'))
+            self.preview_patcher.mark_ranges(ranges)
+
+        elif content_type == 'Markdown':
+            replaced_code = self.replace_placeholders_with_inputs(values=values)
+            # 在后台线程渲染, 只应用最新的结果 (apply_markdown_preview)
+            self.markdown_generation = self.markdown_worker.submit(replaced_code)
         else:
-            replaced_code = self.replace_placeholders_with_inputs(code)
-            self.text_edit_replaced.setPlainText(replaced_code)
+            replaced_code = self.replace_placeholders_with_inputs(values=values)
+            self.preview_patcher.update(replaced_code.split('\n'))
+
+    def set_preview_text_color(self, plain_text):
+        # Plain text 的预览是绿色的, 其它类型用默认颜色
+        color = QColor('green') if plain_text else self.palette().color(QPalette.Text)
+        palette = self.text_edit_replaced.palette()
+        if palette.color(QPalette.Text) != color:
+            palette.setColor(QPalette.Text, color)
+            self.text_edit_replaced.setPalette(palette)
+
+    def apply_markdown_preview(self, generation, html):
+        if generation != self.markdown_generation:
+            return
+        # Markdown 不能按行替换, 整体重新加载, 保留滚动位置
+        self.preview_patcher.set_html(html)
+
+    def preview_chunks_loaded(self):
+        self.preview_patcher.set_loaded(self.preview_pending_lines)
+        self.preview_pending_lines = None
 
     def save_snippet(self):
         if not self.current_snippet_file:
             print("No snippet is currently selected.")
             return
+
+        if self.chunk_loader.isActive():
+            # 大文档还没加载完, 不能保存不完整的内容
+            return
         
         title = self.title_lineedit.text()
         print(f'title={title} saved')
+        folder = normalize_folder(self.folder_lineedit.text())
         snippet_type = self.type_combobox.currentText()
         content = self.text_edit.toPlainText()
-        placeholders = re.findall(r'\$\w+', content)
+        placeholders = self.placeholder_index.placeholders()
 
         now = datetime.datetime.now()
         timestamp = now.strftime("%Y-%m-%d %H:%M:%S.%f")
@@ -607,71 +894,286 @@ class MainWindow(QWidget):
             'timestamp': timestamp,
             **placeholder_dict
         }
+        if folder:
+            snippet['folder'] = folder
 
-        try:
-            with open(self.current_snippet_file, 'w', encoding='utf-8') as f:
-                json.dump(snippet, f, ensure_ascii=False, indent=4)
-            
-            print(f"save and update item => {self.current_snippet_file} title={title}")
+        self.snippet_writer.submit(self.current_snippet_file, snippet)
+        self.text_edit.document().setModified(False)
+        print(f"save and update item => {self.current_snippet_file} title={title}")
 
-            self.change_item(self.current_snippet_file, snippet_type, title, timestamp)
-        
-        except Exception as e:
-            print(f"Error saving snippet: {e}")
-
-
-    def change_item(self, file_path, snippet_type, title, timestamp):
-        # 遍历 tree_model 的所有行
-        for row in range(self.tree_model.rowCount()):
-            # 获取当前行的 file_path 项
-            file_path_item = self.tree_model.item(row, 2)
-            if file_path_item and file_path_item.text() == file_path:
-                # 修改 title 项
-                title_item = self.tree_model.item(row, 0)
-                if title_item:
-                    title_item.setText(title)
-
-                # 修改 snippet_type 项
-                type_item = self.tree_model.item(row, 1)
-                if type_item:
-                    type_item.setText(snippet_type)
-
-                # 修改 timestamp 项
-                timestamp_item = self.tree_model.item(row, 3)
-                if timestamp_item:
-                    timestamp_item.setText(timestamp)
-                break
+        self.change_item(self.current_snippet_file, snippet_type, title, timestamp, folder)
 
-    def add_item(self, file_path, snippet_type, title, timestamp):
-        # 创建新的 QStandardItem 实例
-        title_item = QStandardItem(title)
-        type_item = QStandardItem(snippet_type)
-        file_path_item = QStandardItem(file_path)
-        timestamp_item = QStandardItem(timestamp)
 
-        # 在 tree_model 中添加新行
-        row = [title_item, type_item, file_path_item, timestamp_item]
-        self.tree_model.appendRow(row)
+    def change_item(self, file_path, snippet_type, title, timestamp, folder=''):
+        row = self.tree_model.find_row(file_path)
+        if row < 0:
+            return
+        if self.tree_model.folder_path(row) == normalize_folder(folder):
+            self.tree_model.update_row(row, title, snippet_type, timestamp)
+            return
+
+        # 换了文件夹: 从原来的文件夹删掉, 加到新文件夹里, 当前 snippet 保持选中 (不重新加载编辑器)
+        self.tree_model.remove_row(row)
+        proxy_index = self.add_item(file_path, snippet_type, title, timestamp, folder)
+        if file_path == self.current_snippet_file:
+            self.select_tree_item_by_proxy_index(proxy_index, notify=False)
 
-        # 获取新添加项的源模型索引
-        source_index = self.tree_model.index(self.tree_model.rowCount() - 1, 0)
+    def add_item(self, file_path, snippet_type, title, timestamp, folder=''):
+        row = self.tree_model.append_rows([(title, snippet_type, file_path, timestamp, folder)])[0]
 
-        # 将源模型索引转换为代理模型索引
+        # 获取新添加项的源模型索引 (所在的文件夹会先展开), 转换为代理模型索引
+        source_index = self.tree_model.index_for_row(row)
         proxy_index = self.proxy_model.mapFromSource(source_index)
 
         return proxy_index
 
+    def add_items(self, rows):
+        # 批量添加: 每个文件夹只发一次 rowsInserted, 没展开的文件夹不发
+        self.tree_model.append_rows([(title, snippet_type, file_path, timestamp, folder)
+                                     for file_path, snippet_type, title, timestamp, folder in rows])
+
+    def show_tree_context_menu(self, pos):
+        menu = QMenu(self)
+
+        import_dir_action = QAction("Import Directory...", self)
+        import_dir_action.triggered.connect(self.import_directory_slot)
+        menu.addAction(import_dir_action)
+
+        import_archive_action = QAction("Import Archive...", self)
+        import_archive_action.triggered.connect(self.import_archive_slot)
+        menu.addAction(import_archive_action)
+
+        menu.addSeparator()
+
+        history_action = QAction("History...", self)
+        history_action.setEnabled(self.current_snippet_file is not None)
+        history_action.triggered.connect(self.show_history_slot)
+        menu.addAction(history_action)
+
+        sort_usage_action = QAction("Sort by Usage", self)
+        sort_usage_action.setCheckable(True)
+        sort_usage_action.setChecked(self.tree_sort_by_usage)
+        sort_usage_action.toggled.connect(self.sort_tree_by_usage)
+        menu.addAction(sort_usage_action)
+
+        menu.addSeparator()
+
+        export_action = QAction("Export...", self)
+        export_action.triggered.connect(self.export_slot)
+        menu.addAction(export_action)
+
+        # 只有 json 存储有解析缓存
+        if getattr(self.store, 'cache', None) is not None:
+            cache_stats_action = QAction("Cache Stats...", self)
+            cache_stats_action.triggered.connect(self.show_cache_stats_slot)
+            menu.addAction(cache_stats_action)
+
+        menu.exec_(self.tree.viewport().mapToGlobal(pos))
+
+    def show_cache_stats_slot(self):
+        stats = self.store.cache.stats()
+        QMessageBox.information(self, 'Cache Stats',
+                                f"hits {stats['hits']}, misses {stats['misses']} ({stats['hit_rate']:.1%})\n"
+                                f"{stats['entries']} snippets, {stats['bytes']} of {stats['max_bytes']} bytes")
+
+    def show_history_slot(self):
+        key = self.current_snippet_file
+        if key is None:
+            return
+
+        # 先把当前内容落盘并记一版, 恢复旧版本后还能回到现在
+        self.save_snippet_changes()
+        self.snippet_writer.flush()
+        try:
+            self.history.record(key, self.load_snippet(key), force=True)
+        except Exception as e:
+            print(f"Error recording history for {key}: {e}")
+
+        revisions = self.history.list_revisions(key)
+        if not revisions:
+            return
+        items = [f'#{rev}  {timestamp}' for rev, timestamp, _ in reversed(revisions)]
+        item, ok = QInputDialog.getItem(self, 'History', 'Restore revision:', items, 0, False)
+        if not ok:
+            return
+
+        rev = revisions[len(revisions) - 1 - items.index(item)][0]
+        snippet = self.history.restore(key, rev)
+        if snippet is None:
+            return
+        print(f'restore => {key} rev={rev}')
+
+        # 作为一次普通编辑写回编辑器, 可以撤销, 之后由自动保存落盘
+        self.title_lineedit.setText(snippet.get('title', ''))
+        self.folder_lineedit.setText(snippet.get('folder', ''))
+        self.type_combobox.setCurrentIndex(self.type_combobox.findText(snippet.get('type', 'Plain text')))
+        cursor = self.text_edit.textCursor()
+        cursor.select(QTextCursor.Document)
+        cursor.insertText(snippet.get('content', ''))
+        self.update_input_layout()
+        for placeholder, value in snippet.items():
+            if placeholder.startswith('$') and placeholder in self.input_widgets:
+                self.input_widgets[placeholder].setText(value)
+
+    def import_directory_slot(self):
+        dir_path = QFileDialog.getExistingDirectory(self, 'Import Directory')
+        if dir_path:
+            self.import_snippets_from(dir_path)
+
+    def import_archive_slot(self):
+        path, _ = QFileDialog.getOpenFileName(self, 'Import Archive', '', 'Snippet archives (*.jsonl *.zip)')
+        if path:
+            self.import_snippets_from(path)
+
+    def import_snippets_from(self, path):
+        self.save_snippet_changes()
+
+        progress = QProgressDialog('Importing snippets...', 'Cancel', 0, 0, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.show()
+
+        def on_progress(count):
+            progress.setLabelText(f'Imported {count} snippets...')
+            QApplication.processEvents()
+            return not progress.wasCanceled()
+
+        try:
+            imported = import_snippets(self.store, path, datetime.datetime.now(), progress=on_progress)
+        except Exception as e:
+            print(f"Error importing {path}: {e}")
+            imported = []
+        finally:
+            progress.close()
+
+        self.add_items([(key, snippet['type'], snippet['title'], snippet['timestamp'], snippet.get('folder', ''))
+                        for key, snippet in imported])
+        self.index_snippets_in_background(imported)
+        print(f'imported {len(imported)} snippets from {path}')
+
+    def export_slot(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'Export', 'snippets.zip', 'Zip archive (*.zip);;JSON lines (*.jsonl)')
+        if not path:
+            return
+
+        self.save_snippet_changes()
+        self.snippet_writer.flush()
+
+        keys = self.store.keys()
+        progress = QProgressDialog('Exporting snippets...', 'Cancel', 0, len(keys), self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.show()
+
+        def on_progress(count):
+            progress.setValue(count)
+            return not progress.wasCanceled()
+
+        try:
+            exported = export_snippets(self.store, keys, path, progress=on_progress)
+            print(f'exported {exported} snippets to {path}')
+        except Exception as e:
+            print(f"Error exporting {path}: {e}")
+        finally:
+            progress.close()
+
+    def apply_external_changes(self, changed, removed):
+        print(f'data dir changed => {len(changed)} changed, {len(removed)} removed')
+
+        # 批量修改期间暂停 proxy 的动态排序/过滤和视图刷新, 结束后只重排一次
+        scroll_value = self.tree.verticalScrollBar().value()
+        self.tree.setUpdatesEnabled(False)
+        self.proxy_model.setDynamicSortFilter(False)
+
+        # 先删除, 新增的行可以直接填进删除留下的空位
+        for key in removed:
+            self.search_index.remove(key)
+            row = self.tree_model.find_row(key)
+            if row >= 0:
+                self.tree_model.remove_row(row)
+
+        new_rows = []
+        for meta in changed:
+            file_path = meta['file_path']
+            title = meta.get('title', 'Unknown')
+            snippet_type = meta.get('type', 'Unknown')
+            timestamp = meta.get('timestamp', '')
+            folder = meta.get('folder', '')
+            row = self.tree_model.find_row(file_path)
+            if row >= 0 and self.tree_model.folder_path(row) == normalize_folder(folder):
+                self.tree_model.update_row(row, title, snippet_type, timestamp)
+            else:
+                if row >= 0:
+                    # 被移到了别的文件夹
+                    self.tree_model.remove_row(row)
+                new_rows.append((title, snippet_type, file_path, timestamp, folder))
+
+        self.tree_model.append_rows(new_rows)
+        self.index_snippets_in_background(self.iter_loaded_snippets([meta['file_path'] for meta in changed]))
+
+        self.proxy_model.setDynamicSortFilter(True)
+        self.proxy_model.invalidate()
+        self.tree.setUpdatesEnabled(True)
+        self.tree.verticalScrollBar().setValue(scroll_value)
+
+        if self.current_snippet_file in removed:
+            self.current_snippet_file = None
+        elif self.current_snippet_file in (meta['file_path'] for meta in changed):
+            self.current_snippet_changed_externally()
+
+    def current_snippet_changed_externally(self):
+        key = self.current_snippet_file
+        if not (self.dirty_fields and self.changed_fields()) and self.snippet_writer.latest(key) is None:
+            # 没有本地修改, 直接重新读取
+            self.open_snippet(key)
+            return
+
+        # 本地也有还没写出去的修改: 先停住自动保存和写盘, 外部的版本记进历史, 再问用户留哪一份
+        self.autosave_timer.stop()
+        local_snippet = self.snippet_writer.discard(key)
+        try:
+            self.history.record(key, self.store.load(key), force=True)
+        except Exception as e:
+            print(f"Error recording history for {key}: {e}")
+        if self.resolving_conflict:
+            return
+
+        print(f'conflict => {key} changed outside while editing')
+        self.resolving_conflict = True
+        try:
+            reply = QMessageBox.question(self, 'Snippet Changed',
+                                         f'"{self.title_lineedit.text()}" was changed outside while you were editing it.\n\n'
+                                         'Reload it and discard your unsaved edits?\n'
+                                         'No keeps your edits and saves them over the other version, '
+                                         'which stays in History.',
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        finally:
+            self.resolving_conflict = False
+        if self.current_snippet_file != key:
+            return
+
+        if reply == QMessageBox.Yes:
+            self.autosave_timer.stop()
+            self.dirty_fields.clear()
+            self.open_snippet(key)
+            return
+        if local_snippet is not None:
+            self.snippet_writer.submit(key, local_snippet)
+        if self.dirty_fields:
+            self.autosave_timer.start()
+
     def del_item(self, file_path):
-        # 遍历 tree_model 的所有行
-        for row in range(self.tree_model.rowCount()):
-            # 获取当前行的 file_path 项
-            file_path_item = self.tree_model.item(row, 2)
-            if file_path_item and file_path_item.text() == file_path:
-                # 删除匹配的行
-                self.tree_model.removeRow(row)
-                break
+        row = self.tree_model.find_row(file_path)
+        if row >= 0:
+            self.tree_model.remove_row(row)
 
     def apply_highlighter(self, snippet_type):
+        # 先把旧的 highlighter 从文档上卸下来, 否则会叠加多个 highlighter
+        for highlighter in (self.highlighter, self.highlighter_replaced):
+            if highlighter is not None:
+                highlighter.setDocument(None)
+                highlighter.deleteLater()
+        self.highlighter = None
+        self.highlighter_replaced = None
+
         if snippet_type == 'Python':
             self.highlighter = PythonHighlighter(self.text_edit.document())
             self.highlighter_replaced = PythonHighlighter(self.text_edit_replaced.document())
@@ -682,6 +1184,13 @@ class MainWindow(QWidget):
             self.highlighter = PlainTextHighlighter(self.text_edit.document())
             self.highlighter_replaced = PlainTextHighlighter(self.text_edit_replaced.document())
 
+        if self.large_document_mode and self.highlighter is not None:
+            self.highlighter.set_viewport_editor(self.text_edit)
+            # 预览不做语法高亮
+            self.highlighter_replaced.setDocument(None)
+            self.highlighter_replaced.deleteLater()
+            self.highlighter_replaced = None
+
     def delete_snippet(self):
         reply = QMessageBox.question(self, 'Confirm Deletion', 'Are you sure you want to delete this item?',
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
@@ -690,9 +1199,14 @@ class MainWindow(QWidget):
         
         if self.current_snippet_file:
             try:
-                os.remove(self.current_snippet_file)
+                self.snippet_writer.discard(self.current_snippet_file)
+                self.store.delete(self.current_snippet_file)
+                self.history.delete(self.current_snippet_file)
+                self.usage.delete(self.current_snippet_file)
+                self.search_index.remove(self.current_snippet_file)
                 self.del_item(self.current_snippet_file)
-                
+                self.current_snippet_file = None
+
             except Exception as e:
                 print(f"Error deleting snippet: {e}")
         else:
@@ -702,15 +1216,13 @@ class MainWindow(QWidget):
         new_title = "New Snippet"
         new_type = "Plain text"
         new_content = ""
+        # 新的 snippet 放在当前 snippet 所在的文件夹里
+        new_folder = normalize_folder(self.folder_lineedit.text()) if self.current_snippet_file else ''
 
         now = datetime.datetime.now()
         timestamp = now.strftime("%Y-%m-%d %H:%M:%S.%f")
         # print(f'timestamp={timestamp}')
         timestamp = timestamp[:-3]
-        
-        file_name_ts = now.strftime("%Y%m%d%H%M%S%f")
-        file_name = f"snippet_{file_name_ts}.json"
-        file_path = os.path.join(self.data_dir, file_name)
 
         new_snippet = {
             'type': new_type,
@@ -718,12 +1230,14 @@ class MainWindow(QWidget):
             'content': new_content,
             'timestamp': timestamp
         }
+        if new_folder:
+            new_snippet['folder'] = new_folder
 
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(new_snippet, f, ensure_ascii=False, indent=4)
+            file_path = self.store.add(new_snippet, now)
+            self.search_index.update(file_path, new_snippet)
 
-            proxy_index = self.add_item(file_path, new_type, new_title, timestamp)
+            proxy_index = self.add_item(file_path, new_type, new_title, timestamp, new_folder)
             self.select_tree_item_by_proxy_index(proxy_index)
             # self.handle_item_selection_by_proxy_index(proxy_index)
 
@@ -755,12 +1269,20 @@ class MainWindow(QWidget):
     #         self.select_tree_item(first_row_index)
 
 
-    def select_tree_item_by_proxy_index(self, index):
-        self.tree.selectionModel().clearSelection()
-        start_index = self.proxy_model.index(index.row(), 0)
-        end_index = self.proxy_model.index(index.row(), self.proxy_model.columnCount() - 1)
+    def select_tree_item_by_proxy_index(self, index, notify=True):
+        # notify=False 时不触发 on_selection_changed (不重新加载编辑器)
+        selection_model = self.tree.selectionModel()
+        selection_model.blockSignals(not notify)
+        selection_model.clearSelection()
+        start_index = index.sibling(index.row(), 0)
+        end_index = index.sibling(index.row(), self.proxy_model.columnCount() - 1)
         selection = QItemSelection(start_index, end_index)
-        self.tree.selectionModel().select(selection, QItemSelectionModel.SelectCurrent)
+        selection_model.select(selection, QItemSelectionModel.SelectCurrent)
+        selection_model.blockSignals(False)
+        if index.isValid():
+            # 会展开所在的文件夹
+            self.tree.scrollTo(index)
+        self.tree.viewport().update()
 
 
 if __name__ == '__main__':
@@ -36,8 +36,52 @@ STYLES = {
 }
 
 
-
-class PythonHighlighter(QSyntaxHighlighter):
+class ViewportHighlightMixin:
+    # 大文档模式: 只高亮 editor (QPlainTextEdit) 可见区域内的 block,
+    # 不可见的 block 状态记为 -1, 滚动到可见时再补高亮
+    viewport_editor = None
+    viewport_range = (0, -1)
+    highlighting_viewport = False
+
+    def set_viewport_editor(self, editor):
+        self.viewport_editor = editor
+        editor.updateRequest.connect(self.highlight_visible_blocks)
+        self.highlight_visible_blocks()
+
+    def is_block_in_viewport(self):
+        if self.viewport_editor is None:
+            return True
+        first, last = self.viewport_range
+        return first <= self.currentBlock().blockNumber() <= last
+
+    def highlight_visible_blocks(self, *args):
+        if self.highlighting_viewport or self.document() is None:
+            return
+
+        editor = self.viewport_editor
+        block = editor.firstVisibleBlock()
+        offset = editor.contentOffset()
+        height = editor.viewport().height()
+        first = last = block.blockNumber()
+        visible_blocks = []
+        while block.isValid():
+            if editor.blockBoundingGeometry(block).translated(offset).top() > height:
+                break
+            last = block.blockNumber()
+            visible_blocks.append(block)
+            block = block.next()
+        self.viewport_range = (first, last)
+
+        self.highlighting_viewport = True
+        try:
+            for block in visible_blocks:
+                if block.userState() == -1:
+                    self.rehighlightBlock(block)
+        finally:
+            self.highlighting_viewport = False
+
+
+class PythonHighlighter(ViewportHighlightMixin, QSyntaxHighlighter):
     keywords = [
         'and', 'assert', 'break', 'class', 'continue', 'def',
         'del', 'elif', 'else', 'except', 'exec', 'finally',
@@ -97,6 +141,10 @@ class PythonHighlighter(QSyntaxHighlighter):
                       for (pat, index, fmt) in rules]
 
     def highlightBlock(self, text):
+        if not self.is_block_in_viewport():
+            self.setCurrentBlockState(-1)
+            return
+
         for expression, nth, format in self.rules:
             index = expression.search(text)
             while index:
@@ -108,7 +156,7 @@ class PythonHighlighter(QSyntaxHighlighter):
 
 
 
-class CppHighlighter(QSyntaxHighlighter):
+class CppHighlighter(ViewportHighlightMixin, QSyntaxHighlighter):
     keywords = [
         'alignas', 'alignof', 'and', 'and_eq', 'asm', 'atomic_cancel',
         'atomic_commit', 'atomic_noexcept', 'auto', 'bitand', 'bitor',
@@ -171,6 +219,10 @@ class CppHighlighter(QSyntaxHighlighter):
                       for (pat, index, fmt) in rules]
 
     def highlightBlock(self, text):
+        if not self.is_block_in_viewport():
+            self.setCurrentBlockState(-1)
+            return
+
         for expression, nth, format in self.rules:
             index = expression.search(text)
             while index:
@@ -180,12 +232,16 @@ class CppHighlighter(QSyntaxHighlighter):
         self.setCurrentBlockState(0)
 
 
-class PlainTextHighlighter(QSyntaxHighlighter):
+class PlainTextHighlighter(ViewportHighlightMixin, QSyntaxHighlighter):
     def __init__(self, document):
         QSyntaxHighlighter.__init__(self, document)
         self.rules = [(re.compile(r'\$\w+'), 0, STYLES['placeholder'])]
 
     def highlightBlock(self, text):
+        if not self.is_block_in_viewport():
+            self.setCurrentBlockState(-1)
+            return
+
         for expression, nth, format in self.rules:
             index = expression.search(text)
             while index:
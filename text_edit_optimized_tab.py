@@ -3,7 +3,7 @@
 
 import re
 
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QTextEdit, QShortcut, QLineEdit, QPushButton, QHBoxLayout, QGridLayout, QMessageBox, QAction, QCheckBox, QHeaderView, QLabel, QTreeView, QSplitter, QComboBox, QAbstractItemView
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QTextEdit, QPlainTextEdit, QShortcut, QLineEdit, QPushButton, QHBoxLayout, QGridLayout, QMessageBox, QAction, QCheckBox, QHeaderView, QLabel, QTreeView, QSplitter, QComboBox, QAbstractItemView
 from PyQt5.QtGui import QColor, QTextCharFormat, QFont, QSyntaxHighlighter, QKeySequence, QStandardItemModel, QStandardItem, QIcon, QKeyEvent, QTextCursor
 from PyQt5.QtCore import Qt, QItemSelectionModel, QItemSelection, QSettings, QRegularExpression, QSortFilterProxyModel, QModelIndex, QMimeData, QTimer
 
@@ -32,7 +32,8 @@ def remove_leading_spaces(line, remove_count):
     return line[index:]
 
 
-class TextEditOptimizedTab(QTextEdit):
+# 基于 QPlainTextEdit, 对几 MB 的纯文本也能保持流畅
+class TextEditOptimizedTab(QPlainTextEdit):
     def insertFromMimeData(self, source: QMimeData):
         if source.hasText():
             text = source.text()
@@ -0,0 +1,172 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from background_worker import BackgroundWorker
+from tree_view_proxy import compile_matcher
+from fuzzy_search import FuzzySearch
+from snippet_query import parse_query, is_structured, MetadataIndex, QueryPlanner
+
+
+class TreeFilterWorker(QObject, BackgroundWorker):
+    """在后台线程里计算 tree 的过滤结果
+
+    submit() 提交的是 row 数据的快照 (haystack 都是不可变的 tuple), 工作线程只保留最新的一个请求;
+    正在计算的请求发现有更新的请求时直接放弃. 结果通过 filtered 信号回到界面线程.
+    带 type:/title:/body:/placeholder:/after:/before: 字段的查询交给 QueryPlanner, 优先于正则和模糊搜索.
+    """
+
+    # generation, 接受的 key (set 或排好序的 list), 是否按排名排序
+    filtered = pyqtSignal(int, object, bool)
+
+    def __init__(self, search_index=None, fuzzy_top_k=500, parent=None):
+        super().__init__(parent)
+        self.search_index = search_index
+        self.fuzzy_search = FuzzySearch(fuzzy_top_k)
+        # tree 的行 [(title, type, key, timestamp)], 模糊搜索的候选和 MetadataIndex 都从它派生, 用到时才建
+        self.rows = []
+        self.fuzzy_items_stale = True
+        self.metadata = None
+        self.parsed_query = (None, None)
+        self.start_thread('TreeFilterWorker')
+
+    def submit(self, text, regex=False, fuzzy=False, haystacks=None, rows=None, usage=None):
+        """haystacks: proxy.snapshot_haystacks(); rows: tree 有变化时才传 [(title, type, key, timestamp)];
+        usage: 使用频率有变化时才传 {key: frecency 分数}, 模糊搜索时加分"""
+        with self.condition:
+            if self.pending is not None:
+                # 被覆盖的请求里可能带着新的行和使用频率, 不能丢
+                previous = self.pending[1]
+                rows = previous['rows'] if rows is None else rows
+                usage = previous['usage'] if usage is None else usage
+            return self.post({'text': text, 'regex': regex, 'fuzzy': fuzzy,
+                              'haystacks': haystacks, 'rows': rows, 'usage': usage})
+
+    def cancel(self):
+        with self.condition:
+            self.generation += 1
+            if self.pending is not None and self.pending[1]['rows'] is None and self.pending[1]['usage'] is None:
+                self.pending = None
+
+    def handle(self, request):
+        generation, query = request
+        result = self.filter(generation, query)
+        if result is not None:
+            keys, ranked = result
+            self.filtered.emit(generation, keys, ranked)
+
+    def parse(self, text):
+        # 同一个查询文本只解析一次 (正则/模糊切换时文本不变)
+        if self.parsed_query[0] != text:
+            self.parsed_query = (text, parse_query(text))
+        return self.parsed_query[1]
+
+    def filter(self, generation, request):
+        """返回 (accepted keys, 是否按排名排序), 请求过期时返回 None"""
+        if request['rows'] is not None:
+            self.rows = request['rows']
+            self.fuzzy_items_stale = True
+            self.metadata = None
+        if request['usage'] is not None:
+            self.fuzzy_search.set_usage(request['usage'])
+        if self.is_stale(generation):
+            return None
+
+        text = request['text']
+        terms = self.parse(text)
+        if is_structured(terms):
+            if self.metadata is None:
+                self.metadata = MetadataIndex(self.rows)
+            planner = QueryPlanner(self.metadata, self.search_index, request['haystacks'])
+            accepted = planner.execute(terms, lambda: self.is_stale(generation))
+            return None if accepted is None else (accepted, False)
+
+        if request['fuzzy']:
+            if self.fuzzy_items_stale:
+                self.fuzzy_search.set_items((key, title, timestamp) for title, _, key, timestamp in self.rows)
+                self.fuzzy_items_stale = False
+            ranked = self.fuzzy_search.search(text, lambda: self.is_stale(generation))
+            return None if ranked is None else ([key for key, _ in ranked], True)
+
+        regex = request['regex']
+        matcher = compile_matcher(text, regex, case_sensitive=regex)
+        body_keys = self.search_index.search(text, regex=regex) if self.search_index is not None else set()
+        accepted = set(body_keys)
+        for count, haystack in enumerate(request['haystacks']):
+            if count % 4096 == 0 and self.is_stale(generation):
+                return None
+            if haystack and matcher(haystack):
+                accepted.add(haystack[2])
+        return accepted, False
+
+
+def benchmark(row_count=100000, typed='snippet title 4212', keystroke_ms=60):
+    # python tree_filter_worker.py [row_count]
+    import sys
+    import time
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QTimer, QEventLoop
+    from snippet_tree_model import SnippetTreeModel, COLUMN_FILE
+    from tree_view_proxy import RecursiveFilterProxyModel
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    model = SnippetTreeModel()
+    model.set_rows([(f'Snippet title {i}', 'Python', f'data/snippet_{i:08d}.json', f'2025-01-01 00:00:{i % 60:02d}.000')
+                    for i in range(row_count)])
+    proxy = RecursiveFilterProxyModel()
+    proxy.setSourceModel(model)
+    proxy.set_key_column(COLUMN_FILE)
+    proxy.snapshot_haystacks()
+
+    # 原来的做法: 每次按键都在界面线程里同步过滤
+    blocked = []
+    for length in range(1, len(typed) + 1):
+        start = time.perf_counter()
+        proxy.set_filter_text(typed[:length])
+        proxy.rowCount()
+        blocked.append(time.perf_counter() - start)
+    print(f'synchronous: {len(blocked)} filters, GUI blocked {sum(blocked) * 1000:.0f} ms total, '
+          f'{max(blocked) * 1000:.0f} ms worst keystroke')
+    proxy.set_accepted_keys(None)
+    proxy.rowCount()
+
+    # 防抖 + 后台线程: 按键时只重启计时器, 结果回来只 invalidate 一次
+    worker = TreeFilterWorker()
+    debounce = QTimer()
+    debounce.setSingleShot(True)
+    debounce.setInterval(150)
+    blocked = []
+    state = {'text': '', 'generation': 0, 'applied': 0}
+
+    def submit():
+        start = time.perf_counter()
+        state['generation'] = worker.submit(state['text'], haystacks=proxy.snapshot_haystacks())
+        blocked.append(time.perf_counter() - start)
+
+    def apply(generation, keys, ranked):
+        if generation != state['generation']:
+            return
+        start = time.perf_counter()
+        proxy.set_accepted_keys(keys, ranked=ranked)
+        proxy.rowCount()
+        blocked.append(time.perf_counter() - start)
+        state['applied'] += 1
+        loop.quit()
+
+    def keystroke(text):
+        state['text'] = text
+        debounce.start()
+
+    debounce.timeout.connect(submit)
+    worker.filtered.connect(apply)
+    loop = QEventLoop()
+    for length in range(1, len(typed) + 1):
+        QTimer.singleShot(length * keystroke_ms, lambda text=typed[:length]: keystroke(text))
+    QTimer.singleShot(len(typed) * keystroke_ms + 10000, loop.quit)
+    loop.exec_()
+    worker.close()
+    print(f'debounced worker: {state["applied"]} filter applied, GUI blocked {sum(blocked) * 1000:.0f} ms total, '
+          f'{max(blocked) * 1000:.0f} ms worst, {proxy.rowCount()} rows')
+
+
+if __name__ == '__main__':
+    import sys
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
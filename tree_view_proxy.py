@@ -7,28 +7,366 @@ from PyQt5.QtGui import QColor, QTextCharFormat, QFont, QSyntaxHighlighter, QKey
 from PyQt5.QtCore import Qt, QItemSelectionModel, QItemSelection, QSettings, QRegularExpression, QSortFilterProxyModel, QModelIndex, QMimeData, QTimer
 
 
+# 不含正则元字符的查询直接做子串查找, 不用走正则
+REGEX_META_CHARS = set('.^$*+?{}[]\\|()')
+
+
+def compile_matcher(text, regex=False, case_sensitive=False):
+    """把查询编译成 haystack -> bool; haystack 是 (text, folded_text, key), 空查询返回 None"""
+    if not text:
+        return None
+
+    if not regex and not case_sensitive and not (REGEX_META_CHARS & set(text)):
+        needle = text.casefold()
+        return lambda haystack: needle in haystack[1]
+
+    flags = 0 if case_sensitive else re.IGNORECASE
+    try:
+        # 每列一行, ^ 和 $ 对每一列都生效
+        search = re.compile(text, flags | re.MULTILINE).search
+    except re.error:
+        if regex:
+            return lambda haystack: False
+        needle = text if case_sensitive else text.casefold()
+        index = 0 if case_sensitive else 1
+        return lambda haystack: needle in haystack[index]
+    return lambda haystack: search(haystack[0]) is not None
+
+
 class RecursiveFilterProxyModel(QSortFilterProxyModel):
-    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
-        for column in range(self.sourceModel().columnCount(source_parent)):
-            sub_index = self.sourceModel().index(source_row, column, source_parent)
-            text = self.sourceModel().data(sub_index, Qt.DisplayRole)
+    """按整行过滤的 proxy
+
+    查询在 set_filter_text 时只编译一次; 每一行各列的文本拼成一个 haystack (原文和 casefold 各一份),
+    按 source 行号缓存, source model 发出修改信号时只让对应的行失效.
+    source 提供 leaf_row/folder_at/leaf_texts/leaf_folders (SnippetTreeModel, 文件夹懒加载) 时, haystack 按
+    leaf 行号缓存, 文件夹是否显示由它下面所有 snippet 的过滤结果决定, 不需要展开 (fetchMore) 折叠的文件夹.
+    其它 source 用 Qt 自带的递归过滤.
+    设置了 key_column 时, key 在 extra_keys 里的行也会被接受 (例如正文全文检索命中的 snippet).
+    set_accepted_keys 直接给出要显示的 key (例如后台线程算好的过滤结果), 只做一次 invalidate;
+    ranked=True 时不管按哪一列排序都按给定的顺序 (模糊搜索的排名) 排列.
+    leaf source 的排序交给 source 的 sort (预先算好的 key, 一次重排), proxy 保持 source 的顺序,
+    只有按排名显示时 proxy 才自己排序, 这时只剩最多 top_k 行.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.matcher = None  # haystack -> bool, None 表示不过滤
+        self.haystacks = []  # 顶层 source 行号 (或 leaf 行号) -> (text, folded_text, key), 行已删除时为 False, 未计算时为 None
+        self.leaf_source = False
+        self.accepted_folders = None  # 文件夹 -> 它下面被接受的 snippet 的最好名次, 用到时才计算
+        self.leaf_flags = None  # leaf 行号 -> 是否接受 (bytearray), 用到时才计算
+        self.key_column = None
+        self.extra_keys = None
+        self.accepted_keys = None  # 不为 None 时只接受这些 key, 忽略 matcher
+        self.ranking = None  # key -> 名次
+
+    def setSourceModel(self, model):
+        old_model = self.sourceModel()
+        if old_model is not None:
+            for signal, slot in self.cache_connections(old_model):
+                signal.disconnect(slot)
+
+        # 先于 QSortFilterProxyModel 自己的连接, 保证 proxy 重新过滤时缓存已经失效
+        if model is not None:
+            for signal, slot in self.cache_connections(model):
+                signal.connect(slot)
+        self.clear_haystacks()
+        self.leaf_source = hasattr(model, 'leaf_row')
+        self.setRecursiveFilteringEnabled(not self.leaf_source)
+        super().setSourceModel(model)
+
+    def cache_connections(self, model):
+        if hasattr(model, 'leaf_row'):
+            return [(model.snippets_changed, self.on_source_snippets_changed),
+                    (model.modelReset, self.clear_haystacks)]
+        return [(model.dataChanged, self.on_source_data_changed),
+                (model.rowsInserted, self.on_source_rows_inserted),
+                (model.rowsRemoved, self.on_source_rows_removed),
+                (model.rowsMoved, self.clear_haystacks),
+                (model.modelReset, self.clear_haystacks),
+                (model.layoutChanged, self.clear_haystacks)]
+
+    def clear_haystacks(self, *args):
+        self.haystacks = []
+        self.accepted_folders = None
+        self.leaf_flags = None
+
+    def on_source_snippets_changed(self, rows, inserted):
+        haystacks = self.haystacks
+        for row in rows:
+            if row < len(haystacks):
+                haystacks[row] = None
+        self.accepted_folders = None
+        flags = self.leaf_flags
+        if flags is not None:
+            # 只重新判断修改过的行
+            if len(flags) < self.sourceModel().leaf_count():
+                flags.extend(bytes(self.sourceModel().leaf_count() - len(flags)))
+            for row in rows:
+                flags[row] = self.haystack_accepted(self.leaf_haystack(row))
+
+    def on_source_data_changed(self, top_left, bottom_right, roles=None):
+        if top_left.parent().isValid():
+            return
+        for row in range(top_left.row(), min(bottom_right.row() + 1, len(self.haystacks))):
+            self.haystacks[row] = None
+
+    def on_source_rows_inserted(self, parent, first, last):
+        if not parent.isValid() and first < len(self.haystacks):
+            self.haystacks[first:first] = [None] * (last - first + 1)
+
+    def on_source_rows_removed(self, parent, first, last):
+        if not parent.isValid():
+            del self.haystacks[first:last + 1]
+
+    def set_key_column(self, column):
+        self.key_column = column
+        self.clear_haystacks()
+
+    def set_filter_text(self, text, regex=False, case_sensitive=False, extra_keys=None):
+        """regex=False 时 text 仍按正则解释 (兼容原来的行为), 但不是合法正则时退回普通子串匹配"""
+        self.matcher = compile_matcher(text, regex, case_sensitive)
+        self.extra_keys = extra_keys
+        self.accepted_keys = None
+        self.ranking = None
+        self.accepted_folders = None
+        self.leaf_flags = None
+        self.refilter()
+
+    def set_accepted_keys(self, keys, ranked=False):
+        """只显示 key 在 keys 里的行 (过滤结果在别处算好, 这里只做一次 invalidate); keys 为 None 时显示全部
+        ranked=True 时 keys 是排好序的 list, 按这个顺序显示"""
+        self.matcher = None
+        self.extra_keys = None
+        if keys is None:
+            self.accepted_keys = None
+            self.ranking = None
+        elif ranked:
+            self.ranking = {key: rank for rank, key in enumerate(keys)}
+            self.accepted_keys = self.ranking
+        else:
+            self.ranking = None
+            self.accepted_keys = keys if isinstance(keys, (set, frozenset, dict)) else set(keys)
+        self.accepted_folders = None
+        self.leaf_flags = None
+        self.refilter()
+
+    def refilter(self):
+        if not self.leaf_source:
+            self.invalidate()
+            return
+        # 先在结果集上恢复 source 的顺序再过滤; 按排名排序放在过滤之后, 只排剩下的行
+        if self.ranking is None and self.sortColumn() >= 0:
+            super().sort(-1)
+        self.invalidate()
+        if self.ranking is not None:
+            super().sort(0)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if not self.leaf_source:
+            super().sort(column, order)
+            return
+        # source 用预先算好的 key 重排, 一次 layoutChanged; 比 proxy 每次比较都回调 lessThan/data 快得多
+        self.sourceModel().sort(column, order)
+
+    def snapshot_haystacks(self):
+        """所有顶层行 (或所有 leaf, 包括折叠的文件夹里的) 的 haystack (补齐还没算的),
+        返回的 list 可以交给其它线程只读使用"""
+        model = self.sourceModel()
+        if model is None:
+            return []
+        row_count = model.leaf_count() if self.leaf_source else model.rowCount()
+        haystacks = self.haystacks
+        if len(haystacks) < row_count:
+            haystacks.extend([None] * (row_count - len(haystacks)))
+        root = QModelIndex()
+        for row in range(row_count):
+            if haystacks[row] is None:
+                haystacks[row] = self.make_leaf_haystack(row) if self.leaf_source else self.make_haystack(row, root)
+        return list(haystacks)
+
+    def make_haystack(self, source_row, source_parent):
+        model = self.sourceModel()
+        # NoItemFlags 的行是 source model 里已删除的空位, 始终隐藏
+        if model.flags(model.index(source_row, 0, source_parent)) == Qt.NoItemFlags:
+            return False
+        texts = []
+        for column in range(model.columnCount(source_parent)):
+            text = model.data(model.index(source_row, column, source_parent), Qt.DisplayRole)
             if text is not None:
-                regExp = self.filterRegExp().pattern()
-                if regExp:
-                    try:
-                        if re.search(regExp, str(text)):
-                            return True
-                    except re.error:
-                        pass
-                else:
+                texts.append(str(text))
+        text = '\n'.join(texts)
+        key = None
+        if self.key_column is not None:
+            key = model.data(model.index(source_row, self.key_column, source_parent), Qt.DisplayRole)
+        return text, text.casefold(), key
+
+    def make_leaf_haystack(self, leaf):
+        texts = self.sourceModel().leaf_texts(leaf)
+        if texts is None:
+            return False
+        text = '\n'.join(texts)
+        return text, text.casefold(), texts[self.key_column] if self.key_column is not None else None
+
+    def leaf_haystack(self, leaf):
+        haystacks = self.haystacks
+        if leaf >= len(haystacks):
+            haystacks.extend([None] * (self.sourceModel().leaf_count() - len(haystacks)))
+        haystack = haystacks[leaf]
+        if haystack is None:
+            haystack = haystacks[leaf] = self.make_leaf_haystack(leaf)
+        return haystack
+
+    def folder_ranks(self):
+        """有 snippet 被接受的文件夹 -> 其中最靠前的名次 (不排名时都是 0)
+        过滤条件不变时只算一次: 给定 key 时只走这些 key 的上层文件夹, 否则扫一遍所有 leaf 的 haystack"""
+        if self.accepted_folders is None:
+            model = self.sourceModel()
+            if self.accepted_keys is not None:
+                ranking = self.ranking
+                leaves = ((model.find_row(key), ranking[key] if ranking is not None else 0) for key in self.accepted_keys)
+            else:
+                leaves = ((leaf, 0) for leaf, accepted in enumerate(self.accepted_leaves()) if accepted)
+            ranks = {}
+            for leaf, rank in leaves:
+                if leaf < 0:
+                    continue
+                for folder in model.leaf_folders(leaf):
+                    if ranks.get(folder, rank + 1) <= rank:
+                        # 这一层和上面的文件夹已经有同样或更靠前的名次
+                        break
+                    ranks[folder] = rank
+            self.accepted_folders = ranks
+        return self.accepted_folders
+
+    def accepted_leaves(self):
+        """leaf 行号 -> 是否接受; 过滤条件不变时只算一次 (之后随 snippets_changed 逐行更新),
+        source 排序 (layoutChanged) 之后 Qt 重新过滤所有行时每行只是一次下标访问"""
+        if self.leaf_flags is None:
+            model = self.sourceModel()
+            if self.accepted_keys is not None:
+                flags = bytearray(model.leaf_count())
+                for key in self.accepted_keys:
+                    leaf = model.find_row(key)
+                    if leaf >= 0:
+                        flags[leaf] = 1
+            else:
+                flags = bytearray(self.haystack_accepted(self.leaf_haystack(leaf)) for leaf in range(model.leaf_count()))
+            self.leaf_flags = flags
+        return self.leaf_flags
+
+    def row_haystack(self, source_row, source_parent=QModelIndex()):
+        if source_parent.isValid():
+            return self.make_haystack(source_row, source_parent)
+
+        haystacks = self.haystacks
+        if source_row >= len(haystacks):
+            haystacks.extend([None] * (self.sourceModel().rowCount() - len(haystacks)))
+        haystack = haystacks[source_row]
+        if haystack is None:
+            haystack = haystacks[source_row] = self.make_haystack(source_row, source_parent)
+        return haystack
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if self.leaf_source:
+            model = self.sourceModel()
+            leaf = model.leaf_row(source_row, source_parent)
+            if leaf < 0:
+                folder = model.folder_at(source_row, source_parent)
+                if self.accepted_keys is None and self.matcher is None:
+                    return folder.live_count > 0
+                return folder in self.folder_ranks()
+            flags = self.leaf_flags if self.leaf_flags is not None else self.accepted_leaves()
+            return flags[leaf] == 1
+
+        return self.haystack_accepted(self.row_haystack(source_row, source_parent))
+
+    def haystack_accepted(self, haystack):
+        if haystack is False:
+            return False
+        if self.accepted_keys is not None:
+            return haystack[2] in self.accepted_keys
+        if self.matcher is None or self.matcher(haystack):
+            return True
+        return bool(self.extra_keys) and haystack[2] in self.extra_keys
+
+    def lessThan(self, left, right):
+        if self.ranking is None:
+            return super().lessThan(left, right)
+        left_rank = self.row_rank(left)
+        right_rank = self.row_rank(right)
+        # 降序时 Qt 会把结果反过来, 这里再反一次, 名次靠前的总在上面 (leaf source 总是按升序排名次)
+        if self.sortOrder() == Qt.DescendingOrder:
+            return right_rank < left_rank
+        return left_rank < right_rank
+
+    def row_rank(self, source_index):
+        if not self.leaf_source:
+            return self.ranking[self.row_haystack(source_index.row(), source_index.parent())[2]]
+        model = self.sourceModel()
+        leaf = model.leaf_row(source_index.row(), source_index.parent())
+        if leaf < 0:
+            # 文件夹排在它下面最靠前的 snippet 的位置
+            return self.folder_ranks().get(model.folder_at(source_index.row(), source_index.parent()), len(self.ranking))
+        return self.ranking.get(self.leaf_haystack(leaf)[2], len(self.ranking))
+
+
+def benchmark(row_count=100000, queries=('s', 'sn', 'snip', 'snippet 9', 'title 99', r'title \d+5$')):
+    # python tree_view_proxy.py [row_count]
+    import gc
+    import sys
+    import time
+    from snippet_tree_model import SnippetTreeModel
+
+    class OldRecursiveFilterProxyModel(QSortFilterProxyModel):
+        # 修改前的实现: 每行每列都取一次 pattern 并调用 re.search
+        def filterAcceptsRow(self, source_row, source_parent):
+            for column in range(self.sourceModel().columnCount(source_parent)):
+                sub_index = self.sourceModel().index(source_row, column, source_parent)
+                text = self.sourceModel().data(sub_index, Qt.DisplayRole)
+                if text is not None:
                     regularExp = self.filterRegularExpression()
                     if regularExp.match(str(text)).hasMatch():
                         return True
+            index = self.sourceModel().index(source_row, 0, parent=source_parent)
+            for row in range(self.sourceModel().rowCount(index)):
+                if self.filterAcceptsRow(row, index):
+                    return True
+            return super().filterAcceptsRow(source_row, source_parent)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    model = SnippetTreeModel()
+    model.set_rows([(f'Snippet title {i}', 'Python', f'data/snippet_{i:08d}.json', f'2025-01-01 00:00:{i % 60:02d}.000')
+                    for i in range(row_count)])
+
+    old_proxy = OldRecursiveFilterProxyModel()
+    old_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+    old_proxy.setSourceModel(model)
+    new_proxy = RecursiveFilterProxyModel()
+    new_proxy.setSourceModel(model)
+    # 两边从同一个状态开始, 新实现顺便在这里建好 haystack 缓存
+    old_proxy.setFilterRegularExpression('warm up')
+    old_proxy.rowCount()
+    new_proxy.set_filter_text('warm up')
+    new_proxy.rowCount()
+
+    for query in queries:
+        gc.collect()
+        start = time.perf_counter()
+        old_proxy.setFilterRegularExpression(query)
+        old_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        old_rows = old_proxy.rowCount()
+        old_elapsed = time.perf_counter() - start
+
+        gc.collect()
+        start = time.perf_counter()
+        new_proxy.set_filter_text(query)
+        new_rows = new_proxy.rowCount()
+        new_elapsed = time.perf_counter() - start
+        print(f'{query!r:16s} old {old_elapsed * 1000:8.1f} ms ({old_rows} rows)   '
+              f'new {new_elapsed * 1000:8.1f} ms ({new_rows} rows)   x{old_elapsed / new_elapsed:.1f}')
 
-        index = self.sourceModel().index(source_row, 0, parent=source_parent)
-        rows = self.sourceModel().rowCount(index)
-        for row in range(rows):
-            if self.filterAcceptsRow(row, index):
-                return True
 
-        return super().filterAcceptsRow(source_row, source_parent)
+if __name__ == '__main__':
+    import sys
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)